@@ -0,0 +1,109 @@
+from pandac.PandaModules import AudioManager as PandaAudioManager, AudioSound
+from Level import tileSize
+from Map import Map
+
+class AudioManager:
+	#Plays the game's sounds on a fixed number of voices, so a big
+	#chain reaction costs no more than voiceCount sounds at once.
+	#Each sound has its own AudioSound objects, up to its limit, so
+	#sounds from different baddies no longer cut each other off.
+	#
+	#When a sound is over its limit its oldest voice starts again.
+	#When every voice is busy, the lowest priority voice (the oldest
+	#of those) is taken, as long as its priority is no higher than
+	#the new sound's; otherwise the new sound isn't played.  Sounds
+	#played at a position further from the truck than cullDistance
+	#aren't played at all.
+	#
+	#Format: path: (most playing at once, priority, looped, streamed)
+	#Streamed sounds are read from disk as they play instead of
+	#being held decoded in memory.
+	sounds = {"sounds/baddie-explode.wav":(4,2,False,False),
+			  "sounds/baddie-hit.wav":(3,1,False,False),
+			  "sounds/baddie-trigger.wav":(3,1,False,False),
+			  "sounds/truck-idle.wav":(1,3,True,False),
+			  "sounds/truck-forward.wav":(1,3,True,False),
+			  "sounds/winner.wav":(1,4,False,True),
+			  "sounds/loser.wav":(1,4,False,False)}
+	voiceCount = 8
+	cullDistance = Map.viewDistance*tileSize
+
+	def __init__(self,world):
+		self.world = world
+		#path: AudioSound objects made for it
+		self.instances = {}
+		#(path, AudioSound) of the voices started, oldest first
+		self.voices = []
+		#Paths played since the last evictUnused()
+		self.used = set()
+
+	def play(self,path,pos=None):
+		#Play the sound at path, at pos in the map's coordinates
+		#if it comes from somewhere on the map
+		if pos != None and self.isCulled(pos):
+			return
+		self.used.add(path)
+		limit, priority, isLoop, isStream = AudioManager.sounds[path]
+		self.voices = [(voicePath, voice) for voicePath, voice in self.voices
+					   if voice.status() == AudioSound.PLAYING]
+
+		same = [voice for voicePath, voice in self.voices if voicePath == path]
+		if len(same) >= limit:
+			self.restart(path,same[0])
+			return
+		if len(self.voices) >= AudioManager.voiceCount:
+			lowest = None
+			for voicePath, voice in self.voices:
+				if lowest == None or AudioManager.sounds[voicePath][1] < AudioManager.sounds[lowest[0]][1]:
+					lowest = (voicePath,voice)
+			if AudioManager.sounds[lowest[0]][1] > priority:
+				return
+			lowest[1].stop()
+			self.voices.remove(lowest)
+
+		free = [voice for voice in self.instances.setdefault(path,[])
+				if voice.status() != AudioSound.PLAYING]
+		if free:
+			voice = free[0]
+		else:
+			voice = self.load(path,isLoop,isStream)
+			self.instances[path].append(voice)
+		voice.play()
+		self.voices.append((path,voice))
+
+	def restart(self,path,voice):
+		voice.stop()
+		voice.play()
+		self.voices.remove((path,voice))
+		self.voices.append((path,voice))
+
+	def load(self,path,isLoop,isStream):
+		manager = base.sfxManagerList[0]
+		if isStream:
+			voice = manager.getSound(path,False,PandaAudioManager.SMStream)
+		else:
+			voice = manager.getSound(path,False,PandaAudioManager.SMSample)
+		voice.setLoop(isLoop)
+		return voice
+
+	def isCulled(self,pos):
+		truck = self.world.truck
+		if truck == None:
+			return False
+		return (pos-truck.np.getPos()).lengthSquared() > AudioManager.cullDistance*AudioManager.cullDistance
+
+	def stop(self,path):
+		#Stop every voice playing the sound at path
+		for voice in self.instances.get(path,[]):
+			voice.stop()
+
+	def evictUnused(self):
+		#Let go of the sounds not played since the last call,
+		#and of the audio data cached for them
+		manager = base.sfxManagerList[0]
+		for path in [path for path in self.instances if path not in self.used]:
+			for voice in self.instances.pop(path):
+				voice.stop()
+			self.voices = [(voicePath, voice) for voicePath, voice in self.voices if voicePath != path]
+			manager.uncacheSound(path)
+		self.used = set()
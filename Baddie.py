@@ -1,14 +1,13 @@
-from direct.showbase import DirectObject
-from direct.actor.Actor import Actor
-from direct.interval.IntervalGlobal import Sequence,Parallel,Wait,Func
-from pandac.PandaModules import CollisionNode, CollisionSphere, BitMask32
-from pandac.PandaModules import CollisionHandlerEvent
-from pandac.PandaModules import Point3, Vec3
-import sound
-
-class Baddie(DirectObject.DirectObject):
-	id_count = 0
-	targetTiles = []
+from pandac.PandaModules import Point3
+from BaddieStore import StoreField
+import assets
+
+class Baddie:
+	#A baddie only keeps its node path.  The rest of its
+	#state lives in its row of the world's BaddieStore, reached
+	#through the StoreFields below, so baddies can be stepped and
+	#think together.  Subclasses must declare __slots__ as well.
+	__slots__ = ("world","parent","store","index","np")
 	adjustedHeading = {0:180,
 					   90:90,
 					   180:0,
@@ -17,230 +16,223 @@ class Baddie(DirectObject.DirectObject):
 				   90:[ 1, 0],
 				  180:[ 0, 1],
 				  270:[-1, 0]}
-	@classmethod
-	def resetIds(cls):
-		cls.id_count = 0
+	#Actor model path and animations
+	actor = ("models/baddie",
+			 {"walk":"models/baddie-walk",
+			  "explode":"models/baddie-explode",
+			  "die":"models/baddie-die"})
+	#Proximity radii in world units, tested against the
+	#truck and other baddies by the map's SpatialGrid.
+	scale = 0.33
+	triggerRadius = 12*scale
+	explosionRadius = 29*scale
+	hitRadius = 1*scale
+	#Relative headings tried in order when picking the next tile,
+	#for baddies whose choice the BaddieManager works out in bulk.
+	#None means the baddie runs its own think().
+	searchTurns = None
+
+	#Proximity state tested by the map's SpatialGrid.
+	#These are set explicitly in reset()
+	#isTriggerArmed: the truck coming near sets the baddie off
+	#isHitArmed: the truck running into the baddie kills it
+	#isHittable: other explosions can set the baddie off
+	isTriggerArmed = StoreField("isTriggerArmed")
+	isHitArmed = StoreField("isHitArmed")
+	isHittable = StoreField("isHittable")
+	isEnd = StoreField("isEnd")
+	isDead = StoreField("isDead")
 
 	def __init__(self,world,parent,
 				 startColumn,startRow,startHeading):
-		DirectObject.DirectObject.__init__(self)
+		self.np = assets.loadActor(*Baddie.actor)
+		self.np.setScale(Baddie.scale)
+
+		self.reuse(world,parent,startColumn,startRow,startHeading)
+
+	def reuse(self,world,parent,
+			  startColumn,startRow,startHeading):
+		#Set the baddie up on a new level, keeping its actor
+		#from __init__ or from the last level.
 		self.world = world
 		self.parent = parent
-		self.id = Baddie.id_count
-		Baddie.id_count += 1
-		Baddie.targetTiles.append((None,None))
-		
-		self.np = Actor()
-		self.np.loadModel("models/baddie")
-		self.np.loadAnims({"walk":"models/baddie-walk",
-						   "explode":"models/baddie-explode",
-						   "die":"models/baddie-die"})
-		self.np.setScale(0.33)
+		assets.useActor(*Baddie.actor)
+		#Walking, turning and timed actions are run by the world's
+		#BaddieManager, which sets self.store and self.index
+		world.baddieManager.add(self)
+		self.store.startInfo[self.index] = (startColumn,startRow,startHeading)
 		self.np.reparentTo(parent)
 
-		#Load up Sounds
-		self.explodeSound = sound.load("sounds/baddie-explode.wav")
-		self.hitSound = sound.load("sounds/baddie-hit.wav")
-		self.triggerSound = sound.load("sounds/baddie-trigger.wav")
-
-		#Setup collisions solids
-		#BitMasks are set explicitly in reset()
-		triggerSolid = CollisionSphere(0,0,0,12)
-		self.triggerNodeName = "trigger%d" % self.id
-		triggerNode = CollisionNode(self.triggerNodeName)
-		triggerNode.addSolid(triggerSolid)
-		self.triggerNp = self.np.attachNewNode(triggerNode)
-		self.triggerNp.setPos(0,0,1.5)
-		self.triggerHandler = CollisionHandlerEvent()
-		self.triggerHandler.addInPattern("%fn")
-		world.cTrav.addCollider(self.triggerNp, self.triggerHandler)
-
-		explosionSolid = CollisionSphere(0,0,0,29)
-		self.explosionSolid = explosionSolid
-		self.explosionNodeName = "explosion%d" % self.id
-		explosionNode = CollisionNode(self.explosionNodeName)
-		explosionNode.addSolid(explosionSolid)
-		self.explosionNp = self.np.attachNewNode(explosionNode)
-		self.explosionNp.setPos(0,0,1.5)
-		self.explosionHandler = CollisionHandlerEvent()
-		self.explosionHandler.addInPattern("%fn")
-		world.cTrav.addCollider(self.explosionNp,self.explosionHandler)
-		self.accept(self.explosionNodeName, self.kill)
-
-		hitSolid = CollisionSphere(0,0,0,1)
-		self.hitNodeName = "hit%d" % self.id
-		hitNode = CollisionNode(self.hitNodeName)
-		hitNode.addSolid(hitSolid)
-		self.hitNp = self.np.attachNewNode(hitNode)
-		self.hitNp.setPos(0,0,1.5)
-		self.hitHandler = CollisionHandlerEvent()
-		self.hitHandler.addInPattern("%fn")
-		world.cTrav.addCollider(self.hitNp,self.hitHandler)
-
-		self.interval = Wait(0)
-		self.targetPos = None
-		self.targetH = None
-		self.isEnd = False
-		self.startInfo = (startColumn,startRow,startHeading)
+	def getStartInfo(self):
+		return tuple(self.store.startInfo[self.index].tolist())
+
+	def getPos(self):
+		return Point3(*self.store.pos[self.index].tolist())
+
+	def getH(self):
+		return float(self.store.h[self.index])
+
+	def setPosH(self,position,h):
+		store = self.store
+		i = self.index
+		store.pos[i] = store.prevPos[i] = (position.getX(),position.getY(),position.getZ())
+		store.h[i] = store.prevH[i] = h
 
 	def reset(self):
-		startColumn, startRow, startH = self.startInfo
-		self.np.setPos(self.world.map.getTilePos(startColumn,startRow))
-		self.np.setH(Baddie.adjustedHeading[startH])
+		startColumn, startRow, startH = self.getStartInfo()
+		self.setPosH(self.world.map.getTilePos(startColumn,startRow),
+					 Baddie.adjustedHeading[startH])
 		self.setTarget(startColumn,startRow,startH)
 
-		self.triggerNp.node().setIntoCollideMask(BitMask32(0x0))
-		self.triggerNp.node().setFromCollideMask(BitMask32(0x2))
-		self.accept(self.triggerNodeName, self.trigger)
-		self.explosionNp.node().setIntoCollideMask(BitMask32(0x0))
-		self.explosionNp.node().setFromCollideMask(BitMask32(0x0))
-		self.hitNp.node().setIntoCollideMask(BitMask32(0x4))
-		self.hitNp.node().setFromCollideMask(BitMask32(0x2))
-		self.accept(self.hitNodeName, self.die)
+		self.isTriggerArmed = True
+		self.isHitArmed = True
+		self.isHittable = True
 		
 		self.isEnd = False
+		self.isDead = False
 
 		self.np.reparentTo(self.parent)
 		self.np.loop("walk")
+		self.store.isVisible[self.index] = True
+		self.store.drawnH[self.index] = float("nan")
+		self.world.map.grid.add(self)
 		
 		self.think()
-		self.refreshInterval()
+		self.walk()
 
 	def isTargetOk(self,col_index,row_index):
-		try:
-			if self.world.map.getTileWall(col_index,row_index) != None:
-				return False
-			elif (col_index,row_index) in Baddie.targetTiles:
-				return False
-			else:
-				return True
-		except IndexError:
-			return False
+		return self.world.map.isTileOpen(col_index,row_index)
 
 	def setTarget(self,col_index,row_index,heading):
-		self.targetPos = self.world.map.getTilePos(col_index,row_index)
-		Baddie.targetTiles[self.id] = (col_index,row_index)
-		self.targetH = heading
+		#Move this baddie's reservation on the map to the new tile
+		store = self.store
+		i = self.index
+		map = self.world.map
+		self.releaseTarget()
+		map.reserveTile(col_index,row_index)
+		targetPos = map.getTilePos(col_index,row_index)
+		store.targetPos[i] = (targetPos.getX(),targetPos.getY(),targetPos.getZ())
+		store.targetTile[i] = (col_index,row_index)
+		store.targetH[i] = heading
+
+	def releaseTarget(self):
+		col_index, row_index = self.getTargetTile()
+		if col_index >= 0:
+			self.world.map.releaseTile(col_index,row_index)
+			self.store.targetTile[self.index] = (-1,-1)
 
 	def getTargetPos(self):
-		return self.targetPos
+		return Point3(*self.store.targetPos[self.index].tolist())
 
 	def getTargetH(self):
-		return self.targetH
+		return int(self.store.targetH[self.index])
 
 	def getTargetTile(self):
-		return Baddie.targetTiles[self.id]
+		return tuple(self.store.targetTile[self.index].tolist())
+
+	def getFlowHeading(self):
+		#Map heading of the next step towards the truck
+		#from the tile this baddie is heading for, or -1
+		col_index, row_index = self.getTargetTile()
+		return self.world.map.nav.getFlowHeading(col_index,row_index)
 
 	def think(self):
 		#Base Baddie doesn't do much thinking.
 		pass
 
-	def refreshInterval(self):
-		self.interval.pause()
-
-		if self.np.getPos() != self.getTargetPos():
-			targetH = self.getIntervalH(self.getTargetPos())
-		else:
-			targetH = self.np.getH()
-			
-		self.interval = Sequence(Parallel(self.np.hprInterval(0.25,Vec3(targetH,0,0)),
-										  self.np.posInterval(1.0,self.getTargetPos())),
-								 Func(self.think),
-								 Func(self.refreshInterval))
-		self.interval.start()
-
-	def getIntervalH(self,targetPos):
-		currentH = self.np.getH()
-		self.np.lookAt(targetPos)
-		targetH = (180+self.np.getH())%360
-		turnAngle = currentH-targetH
-		if abs(turnAngle) > 180:
-			if turnAngle > 0:
-				currentH = currentH-360
-			else:
-				currentH = currentH+360
-		self.np.setH(currentH)
-		return targetH
+	def walk(self):
+		manager = self.world.baddieManager
+		manager.stop(self)
+		manager.walk(self)
 
 	def explode(self):
-		self.triggerNp.node().setFromCollideMask(BitMask32(0x0))
-		self.interval.pause()
+		self.isTriggerArmed = False
+		manager = self.world.baddieManager
+		manager.stop(self)
 		self.np.play("explode",fromFrame=12)
-		self.interval = Parallel(Sequence(Wait(8.0/24.0),Func(self.activateExplosion)),
-								 Sequence(Wait(36.0/24.0),Func(self.setDead)))
-		self.interval.start()
+		manager.schedule(self,8.0/24.0,self.activateExplosion)
+		manager.schedule(self,36.0/24.0,self.setDead)
 
-	def trigger(self,entry):
-		self.triggerNp.node().setFromCollideMask(BitMask32(0x0))
-		self.interval.pause()
-		
-		targetH = self.getIntervalH(entry.getIntoNodePath())
+	def trigger(self,target):
+		self.isTriggerArmed = False
+		manager = self.world.baddieManager
+		manager.stop(self)
 		
 		self.np.play("explode")
-		self.triggerSound.play()
-		self.interval = Parallel(self.np.hprInterval(0.25,Vec3(targetH,0,0)),
-								 Sequence(Wait(20.0/24.0),Func(self.activateExplosion)),
-								 Sequence(Wait(48.0/24.0),Func(self.setDead)))
-		self.interval.start()
-
-	def kill(self,entry):
-		name = entry.getIntoNode().getName()
-		if name == "truck":
+		self.world.audio.play("sounds/baddie-trigger.wav",self.getPos())
+		manager.turn(self,target.getPos(self.parent))
+		manager.schedule(self,20.0/24.0,self.activateExplosion)
+		manager.schedule(self,48.0/24.0,self.setDead)
+
+	def kill(self,target):
+		if target == self.world.truck:
 			self.world.setLoser()
-		elif name[:3] == "hit":
-			id = int(name[3:])
-			self.world.baddies[id].explode()
-		self.isVictor = True
-
-	def die(self,entry):
-		self.triggerNp.node().setFromCollideMask(BitMask32(0x0))
-		self.explosionNp.node().setFromCollideMask(BitMask32(0x0))
-		self.hitNp.node().setFromCollideMask(BitMask32(0x0))
-		self.interval.pause()
+		else:
+			target.explode()
+
+	def die(self):
+		self.isTriggerArmed = False
+		self.world.map.grid.deactivateExplosion(self)
+		self.isHitArmed = False
+		manager = self.world.baddieManager
+		manager.stop(self)
 		self.np.play("die")
-		self.hitSound.play()
-		self.interval = Sequence(Wait(4.0/24.0),Func(self.setDead))
-		self.interval.start()
+		self.world.audio.play("sounds/baddie-hit.wav",self.getPos())
+		manager.schedule(self,4.0/24.0,self.setDead)
 
 	def activateExplosion(self):
-		self.explosionNp.node().setFromCollideMask(BitMask32(0x2|0x4))
-		self.hitNp.node().setFromCollideMask(BitMask32(0x0))
-		self.hitNp.node().setIntoCollideMask(BitMask32(0x0))
-		self.explodeSound.play()
+		self.world.map.grid.activateExplosion(self)
+		self.isHitArmed = False
+		self.isHittable = False
+		self.world.audio.play("sounds/baddie-explode.wav",self.getPos())
 
 	def setDead(self):
-		Baddie.targetTiles[self.id] = (None,None)
+		self.releaseTarget()
+		self.isDead = True
 		if not self.isEnd:
 			self.np.detachNode()
+			self.store.isVisible[self.index] = False
+			self.world.map.grid.remove(self)
 
 	def setEnd(self,force=False):
-		if force or self.triggerNp.node().getFromCollideMask().getWord():
+		if force or self.isTriggerArmed:
 			self.np.stop()
-			self.interval.pause()
+			self.world.baddieManager.stop(self)
 		self.isEnd = True
-		self.ignore(self.triggerNodeName)
-		self.ignore(self.hitNodeName)
+
+	def release(self):
+		#Leave the level with nothing playing or scheduled.  The
+		#baddie's row of the store is dropped with the level's.
+		self.setEnd(force=True)
+		self.np.stop()
+		self.np.detachNode()
+		self.parent = None
+		self.store = None
+		self.index = None
 
 class StationaryBaddie(Baddie):
-	def __init__(self,world,parent,
-				 startColumn,startRow,startHeading):
-		Baddie.__init__(self,world,parent,
-						startColumn,startRow,startHeading)
+	__slots__ = ("thinkH",)
+	def reuse(self,world,parent,
+			  startColumn,startRow,startHeading):
+		Baddie.reuse(self,world,parent,
+					 startColumn,startRow,startHeading)
 		self.thinkH = None
 
 	def reset(self):
 		Baddie.reset(self)
-		self.thinkH = self.np.getH()
+		self.thinkH = self.getH()
 		
 	def think(self):
 		if self.thinkH != None:
-			startColumn, startRow, startHeading = self.startInfo
-			self.np.setH(self.thinkH)
+			startColumn, startRow, startHeading = self.getStartInfo()
+			self.store.h[self.index] = self.thinkH
 			self.setTarget(startColumn,startRow,startHeading)
 
 class TurningBaddie(Baddie):
+	__slots__ = ()
+	searchTurns = (0,)
 	def turn(self,searchOrder):
-		currentCol, currentRow = Baddie.targetTiles[self.id]
+		currentCol, currentRow = self.getTargetTile()
 		currentH = self.getTargetH()
 		isStuck = True
 	
@@ -253,24 +245,42 @@ class TurningBaddie(Baddie):
 		if isStuck:
 			self.setTarget(currentCol,currentRow,currentH)
 		
-	def think(self,turnOrder=[]):
-		Baddie.think(self)
-		self.turn([self.getTargetH()]) 
-
-class RightTurnBaddie(TurningBaddie):
 	def think(self):
+		#The same choice the BaddieManager makes in bulk
+		#for baddies that arrive together.
 		currentH = self.getTargetH()
-		searchOrder = [ currentH, (currentH+90)%360, (currentH+180)%360, (currentH+270)%360 ]
-		self.turn(searchOrder)
+		self.turn([(currentH+turn)%360 for turn in self.searchTurns])
+
+class RightTurnBaddie(TurningBaddie):
+	__slots__ = ()
+	searchTurns = (0,90,180,270)
 
 class LeftTurnBaddie(TurningBaddie):
-	def think(self):
-		currentH = self.getTargetH()
-		searchOrder = [ currentH, (currentH+270)%360, (currentH+180)%360, (currentH+90)%360 ]
-		self.turn(searchOrder)
+	__slots__ = ()
+	searchTurns = (0,270,180,90)
 
 class BouncingBaddie(TurningBaddie):
+	__slots__ = ()
+	searchTurns = (0,180)
+
+class PursuingBaddie(Baddie):
+	#Chases the truck by following the map's flow field.  When the
+	#tile the flow points at is taken it steps aside onto any other
+	#free tile that is still closer to the truck, and otherwise
+	#waits where it is.
+	__slots__ = ()
 	def think(self):
-		currentH = self.getTargetH()
-		searchOrder = [ currentH, (currentH+180)%360 ]
-		self.turn(searchOrder)
\ No newline at end of file
+		nav = self.world.map.nav
+		currentCol, currentRow = self.getTargetTile()
+		flowH = self.getFlowHeading()
+		if flowH < 0:
+			return
+		distance = nav.getDistance(currentCol,currentRow)
+		for turn in (0,90,270,180):
+			checkH = (flowH+turn)%360
+			mapping = Baddie.headingMap[checkH]
+			col_index = currentCol+mapping[0]
+			row_index = currentRow+mapping[1]
+			if 0 <= nav.getDistance(col_index,row_index) < distance and self.isTargetOk(col_index,row_index):
+				self.setTarget(col_index,row_index,checkH)
+				break
@@ -0,0 +1,183 @@
+import heapq
+import numpy
+from BaddieStore import BaddieStore
+
+class BaddieManager:
+	#Moves every baddie from one scheduler step callback instead of
+	#giving each baddie its own intervals.  Walking and turning state
+	#is kept in a BaddieStore and stepped for all baddies at once,
+	#and timed actions (explosions, deaths) share a single timer queue.
+	#
+	#A walk moves a baddie from where it is to its target tile over
+	#walkTime seconds while turning to face it over turnTime seconds.
+	#All baddies that arrive in a step think together and then
+	#start walking to their new targets.
+	walkTime = 1.0
+	turnTime = 0.25
+	#Tile offset for each map heading, in heading/90 order
+	headingOffsets = numpy.array([[ 0,-1],
+								  [ 1, 0],
+								  [ 0, 1],
+								  [-1, 0]])
+
+	def __init__(self,world):
+		self.world = world
+		self.store = BaddieStore()
+		self.clear()
+
+	def clear(self):
+		self.store.clear()
+		#Timers are (time, order, baddie index, generation, callback).
+		#Stopping a baddie bumps its generation, which cancels
+		#the timers it already had.
+		self.timers = []
+		self.timerCount = 0
+		self.time = 0.0
+
+	def add(self,baddie):
+		baddie.store = self.store
+		baddie.index = self.store.add(baddie)
+
+	def face(self,indices,targets):
+		#Heading that turns each baddie to face its target, with
+		#the baddie's own heading moved by a whole turn where that
+		#makes the turn the short way round.  A baddie already on
+		#its target keeps its heading.
+		store = self.store
+		currentH = store.h[indices]
+		delta = targets-store.pos[indices]
+		isMoving = (delta != 0.0).any(axis=1)
+		lookH = numpy.degrees(numpy.arctan2(-delta[:,0],delta[:,1]))
+		targetH = numpy.where(isMoving,(180.0+lookH)%360.0,currentH)
+		turnAngle = currentH-targetH
+		currentH = numpy.where(turnAngle > 180.0,currentH-360.0,
+							   numpy.where(turnAngle < -180.0,currentH+360.0,currentH))
+		store.h[indices] = currentH
+		return targetH
+
+	def walk(self,baddie):
+		self.walkAll(numpy.array([baddie.index]))
+
+	def walkAll(self,indices):
+		store = self.store
+		targetH = self.face(indices,store.targetPos[indices])
+		store.startPos[indices] = store.pos[indices]
+		store.startH[indices] = store.h[indices]
+		store.turnH[indices] = targetH
+		store.elapsed[indices] = 0.0
+		store.isWalking[indices] = True
+		store.isTurning[indices] = True
+
+	def turn(self,baddie,target):
+		#Turn to face target where the baddie stands
+		i = baddie.index
+		store = self.store
+		targetH = self.face(numpy.array([i]),numpy.array([[target.getX(),target.getY(),target.getZ()]]))
+		store.startH[i] = store.h[i]
+		store.turnH[i] = targetH[0]
+		store.elapsed[i] = 0.0
+		store.isWalking[i] = False
+		store.isTurning[i] = True
+
+	def stop(self,baddie):
+		i = baddie.index
+		store = self.store
+		store.isWalking[i] = False
+		store.isTurning[i] = False
+		store.generation[i] += 1
+
+	def schedule(self,baddie,delay,callback):
+		i = baddie.index
+		heapq.heappush(self.timers,(self.time+delay,self.timerCount,i,int(self.store.generation[i]),callback))
+		self.timerCount += 1
+		self.world.profiler.count("timers")
+
+	def think(self,indices):
+		#Pick new targets for the baddies that arrived this step.
+		#Baddies with a searchTurns order are worked out together:
+		#every candidate tile for all of them is checked against the
+		#map's walls in one pass.  Then the baddies take their first
+		#candidate that is not reserved in index order, so they see
+		#the tiles taken or given up by the baddies before them.
+		#Any other baddie runs its own think().
+		store = self.store
+		map = self.world.map
+		baddies = store.baddies
+		searchTurns = [baddies[i].searchTurns for i in indices.tolist()]
+		width = max([len(turns) for turns in searchTurns if turns != None] or [0])
+		if width:
+			turns = numpy.full((len(indices),width),-1)
+			for k, order in enumerate(searchTurns):
+				if order != None:
+					turns[k,:len(order)] = order
+			tiles = store.targetTile[indices]
+			headings = (store.targetH[indices][:,None]+turns)%360
+			candidates = tiles[:,None,:]+BaddieManager.headingOffsets[headings//90]
+			cols = candidates[:,:,0]
+			rows = candidates[:,:,1]
+			numCols, numRows = map.wallGrid.shape
+			isInside = (cols >= 0) & (cols < numCols) & (rows >= 0) & (rows < numRows)
+			isWall = map.wallGrid[numpy.clip(cols,0,numCols-1),numpy.clip(rows,0,numRows-1)]
+			isOpen = ((turns >= 0) & isInside & ~isWall).tolist()
+			headings = headings.tolist()
+			candidates = candidates.tolist()
+
+		reserveGrid = map.reserveGrid
+		for k, i in enumerate(indices.tolist()):
+			if searchTurns[k] == None:
+				baddies[i].think()
+				continue
+			for j in range(width):
+				col_index, row_index = candidates[k][j]
+				if isOpen[k][j] and not reserveGrid[col_index,row_index]:
+					baddies[i].setTarget(col_index,row_index,headings[k][j])
+					break
+
+	def step(self,dt):
+		profiler = self.world.profiler
+		startTime = profiler.start()
+		self.time += dt
+		store = self.store
+		store.save()
+		n = store.count
+		isWalking = store.isWalking[:n]
+		isTurning = store.isTurning[:n]
+		indices = numpy.flatnonzero(isWalking | isTurning)
+		if len(indices):
+			t = store.elapsed[indices]+dt
+			store.elapsed[indices] = t
+
+			turning = isTurning[indices]
+			i = indices[turning]
+			done = t[turning] >= BaddieManager.turnTime
+			f = t[turning]/BaddieManager.turnTime
+			startH = store.startH[i]
+			turnH = store.turnH[i]
+			store.h[i] = numpy.where(done,turnH,startH+(turnH-startH)*f)
+			store.isTurning[i[done]] = False
+
+			walking = isWalking[indices]
+			i = indices[walking]
+			done = t[walking] >= BaddieManager.walkTime
+			f = t[walking]/BaddieManager.walkTime
+			startPos = store.startPos[i]
+			targetPos = store.targetPos[i]
+			store.pos[i] = numpy.where(done[:,None],targetPos,startPos+(targetPos-startPos)*f[:,None])
+			arrived = i[done]
+			store.isWalking[arrived] = False
+
+			if len(arrived):
+				thinkTime = profiler.start()
+				self.think(arrived)
+				profiler.stop("baddies.think",thinkTime)
+				self.walkAll(arrived)
+
+		#Allow for rounding in the accumulated time
+		timers = self.timers
+		generation = store.generation
+		now = self.time+1e-9
+		while timers and timers[0][0] <= now:
+			when, order, i, timerGeneration, callback = heapq.heappop(timers)
+			if timerGeneration == generation[i]:
+				callback()
+		profiler.stop("baddies",startTime)
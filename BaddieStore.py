@@ -0,0 +1,115 @@
+import numpy
+
+class StoreField:
+	#Attribute of a Baddie that reads and writes
+	#the baddie's row of one of the store's arrays.
+	__slots__ = ("name",)
+
+	def __init__(self,name):
+		self.name = name
+
+	def __get__(self,baddie,owner):
+		if baddie is None:
+			return self
+		return getattr(baddie.store,self.name)[baddie.index]
+
+	def __set__(self,baddie,value):
+		getattr(baddie.store,self.name)[baddie.index] = value
+
+class BaddieStore:
+	#State of every baddie on the level kept as a structure of
+	#arrays, one NumPy array per field with a row per baddie
+	#indexed by baddie.index.  Baddie objects only hold their node
+	#path; everything else is read and written here so
+	#that the BaddieManager can step all of them at once.
+	#
+	#pos and h are the simulated transform.  The node paths are
+	#only brought up to date by sync(), once per rendered frame.
+	#
+	#Field name: (dtype, width, value for a new row)
+	fields = {"pos":(numpy.float64,3,0.0),
+			  "h":(numpy.float64,1,0.0),
+			  "prevPos":(numpy.float64,3,0.0),
+			  "prevH":(numpy.float64,1,0.0),
+			  "drawnPos":(numpy.float64,3,numpy.nan),
+			  "drawnH":(numpy.float64,1,numpy.nan),
+			  #Walking and turning, run by the BaddieManager
+			  "startPos":(numpy.float64,3,0.0),
+			  "targetPos":(numpy.float64,3,0.0),
+			  "startH":(numpy.float64,1,0.0),
+			  "turnH":(numpy.float64,1,0.0),
+			  "elapsed":(numpy.float64,1,0.0),
+			  "isWalking":(numpy.bool_,1,False),
+			  "isTurning":(numpy.bool_,1,False),
+			  "generation":(numpy.int64,1,0),
+			  #Map tile and map heading the baddie is heading for
+			  "targetTile":(numpy.int64,2,-1),
+			  "targetH":(numpy.int64,1,0),
+			  "startInfo":(numpy.int64,3,0),
+			  #Tile the baddie is filed under in the SpatialGrid
+			  "cell":(numpy.int64,2,-1),
+			  "isPlaced":(numpy.bool_,1,False),
+			  "isVisible":(numpy.bool_,1,False),
+			  "isTriggerArmed":(numpy.bool_,1,False),
+			  "isHitArmed":(numpy.bool_,1,False),
+			  "isHittable":(numpy.bool_,1,False),
+			  "isEnd":(numpy.bool_,1,False),
+			  "isDead":(numpy.bool_,1,False)}
+
+	def __init__(self,capacity=64):
+		self.capacity = capacity
+		self.clear()
+
+	def clear(self):
+		self.count = 0
+		self.baddies = []
+		self.allocate(self.capacity)
+
+	def allocate(self,capacity):
+		#(Re)allocate every array with room for capacity rows,
+		#keeping the rows already in use.
+		for name, (dtype, width, default) in BaddieStore.fields.items():
+			if width == 1:
+				array = numpy.full(capacity,default,dtype)
+			else:
+				array = numpy.full((capacity,width),default,dtype)
+			if self.count:
+				array[:self.count] = getattr(self,name)[:self.count]
+			setattr(self,name,array)
+		self.capacity = capacity
+
+	def add(self,baddie):
+		if self.count == self.capacity:
+			self.allocate(self.capacity*2)
+		index = self.count
+		self.count += 1
+		self.baddies.append(baddie)
+		return index
+
+	def save(self):
+		#Remember the current transforms as the start of the
+		#next step, for sync() to interpolate from.
+		n = self.count
+		self.prevPos[:n] = self.pos[:n]
+		self.prevH[:n] = self.h[:n]
+
+	def sync(self,alpha):
+		#Draw every visible baddie alpha of the way through the
+		#last step.  Only node paths whose drawn transform
+		#changes are touched.
+		n = self.count
+		if not n:
+			return
+		prevPos = self.prevPos[:n]
+		prevH = self.prevH[:n]
+		pos = prevPos + (self.pos[:n]-prevPos)*alpha
+		h = prevH + ((self.h[:n]-prevH+180.0)%360.0-180.0)*alpha
+		changed = self.isVisible[:n] & ((pos != self.drawnPos[:n]).any(axis=1) | (h != self.drawnH[:n]))
+		indices = numpy.flatnonzero(changed)
+		if not len(indices):
+			return
+		self.drawnPos[indices] = pos[indices]
+		self.drawnH[indices] = h[indices]
+		baddies = self.baddies
+		for i, (x, y, z), heading in zip(indices.tolist(),pos[indices].tolist(),h[indices].tolist()):
+			baddies[i].np.setPosHpr(x,y,z,heading,0,0)
@@ -0,0 +1,94 @@
+import numpy
+from Baddie import Baddie
+
+class CascadeResolver:
+	#Works out which things the live explosions reach, for chain
+	#reactions of exploding baddies.  When an explosion goes off the
+	#baddies on the tiles its blast covers are looked up in the grid
+	#once, giving the explosion's candidates.  After that a baddie
+	#only joins an explosion's candidates when it walks onto one of
+	#the explosion's tiles, so each step an explosion tests just its
+	#own candidates, all at once from the positions in the store.
+	#Exploding baddies stand still, so an explosion's tiles don't
+	#change while it is live.
+	#
+	#An explosion reaches each thing only once, but a baddie already
+	#set off can still be reached by other explosions until its own
+	#goes off, which starts it exploding again.  reached[source] is a
+	#mask over candidates[source] of the baddies it has reached.
+	def __init__(self,grid):
+		self.grid = grid
+		self.store = grid.store
+		self.radius = Baddie.explosionRadius+Baddie.hitRadius
+		#Live explosions in the order they went off
+		self.sources = []
+		#Maps of exploding baddie to its tiles, the store indices
+		#of its candidates, its reached mask, and whether it has
+		#reached the truck
+		self.cells = {}
+		self.candidates = {}
+		self.reached = {}
+		self.isTruckReached = {}
+		#Map of tile to the explosions covering it
+		self.cellSources = {}
+
+	def activate(self,baddie):
+		self.deactivate(baddie)
+		position = baddie.getPos()
+		cells = self.grid.getCells(position.getX(),position.getY(),self.radius)
+		indices = []
+		for cell in cells:
+			self.cellSources.setdefault(cell,{})[baddie] = True
+			indices.extend([other.index for other in self.grid.cells.get(cell,())
+							if other is not baddie])
+		self.sources.append(baddie)
+		self.cells[baddie] = cells
+		self.candidates[baddie] = numpy.array(sorted(indices),numpy.int64)
+		self.reached[baddie] = numpy.zeros(len(indices),numpy.bool_)
+		self.isTruckReached[baddie] = False
+
+	def deactivate(self,baddie):
+		if baddie not in self.cells:
+			return
+		self.sources.remove(baddie)
+		for cell in self.cells.pop(baddie):
+			del self.cellSources[cell][baddie]
+		del self.candidates[baddie]
+		del self.reached[baddie]
+		del self.isTruckReached[baddie]
+
+	def move(self,baddie,cell):
+		#baddie has walked onto cell, joining the
+		#candidates of any explosion covering it
+		for source in self.cellSources.get(cell,()):
+			candidates = self.candidates[source]
+			if source is not baddie and baddie.index not in candidates:
+				self.candidates[source] = numpy.append(candidates,baddie.index)
+				self.reached[source] = numpy.append(self.reached[source],False)
+
+	def step(self,truck):
+		if not self.sources:
+			return
+		grid = self.grid
+		for baddie in self.sources:
+			if not self.isTruckReached[baddie] and grid.getTruckDistance(baddie.getPos()) <= Baddie.explosionRadius:
+				self.isTruckReached[baddie] = True
+				baddie.kill(truck)
+
+		store = self.store
+		pos = store.pos
+		isHittable = store.isPlaced & store.isHittable
+		radiusSquared = self.radius*self.radius
+		baddies = store.baddies
+		#A kill may take an explosion out of sources
+		for source in list(self.sources):
+			if source not in self.cells:
+				continue
+			candidates = self.candidates[source]
+			offsets = pos[candidates]-pos[source.index]
+			isNew = ((offsets*offsets).sum(axis=1) <= radiusSquared) & isHittable[candidates] & ~self.reached[source]
+			if not isNew.any():
+				continue
+			self.reached[source] |= isNew
+			for i in candidates[isNew].tolist():
+				source.kill(baddies[i])
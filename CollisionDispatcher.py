@@ -0,0 +1,54 @@
+from pandac.PandaModules import CollisionHandlerQueue
+
+class CollisionDispatcher:
+	#Hands collisions found by the traverser straight to the handler
+	#of the "from" node instead of sending them as events through the
+	#messenger.  Every collider shares one CollisionHandlerQueue, and
+	#after each traverse dispatch() goes through its entries once,
+	#finding handlers by the key of the "from" node.
+	#
+	#Like the "in" events of a CollisionHandlerEvent, a handler is
+	#only called when its node first touches another node: entries
+	#for a pair of nodes already touching on the last traverse, and
+	#any further entries for a pair on the same traverse, are dropped.
+	def __init__(self):
+		self.queue = CollisionHandlerQueue()
+		self.handlers = {}
+		self.clear()
+
+	def clear(self):
+		#(from key, into key) of the pairs touching on the last traverse
+		self.contacts = set()
+
+	def addCollider(self,traverser,np,handler):
+		#handler is called with the CollisionEntry
+		traverser.addCollider(np,self.queue)
+		self.handlers[np.getKey()] = handler
+
+	def removeCollider(self,traverser,np):
+		traverser.removeCollider(np)
+		key = np.getKey()
+		del self.handlers[key]
+		self.contacts = set([pair for pair in self.contacts if pair[0] != key])
+
+	def dispatch(self):
+		#Call the handlers for the last traverse, returning
+		#the number of entries it found
+		queue = self.queue
+		count = queue.getNumEntries()
+		lastContacts = self.contacts
+		contacts = set()
+		handlers = self.handlers
+		for i in range(count):
+			entry = queue.getEntry(i)
+			pair = (entry.getFromNodePath().getKey(),entry.getIntoNodePath().getKey())
+			if pair in contacts:
+				continue
+			contacts.add(pair)
+			#A handler may have taken a collider away
+			handler = handlers.get(pair[0])
+			if handler != None and pair not in lastContacts:
+				handler(entry)
+		self.contacts = contacts
+		queue.clearEntries()
+		return count
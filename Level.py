@@ -0,0 +1,295 @@
+#!/usr/bin/env python3
+#Level file parsing and the compiled level cache.
+#
+#Levels are written as text (levels/N.txt) in the format:
+#  name:columns:rows:number of baddies
+#  goal column:goal row
+#  truck column:truck row:truck heading
+#  baddie column:baddie row:baddie heading:baddie symbol  (one per baddie)
+#  one line of tile symbols per row
+#
+#The first time a level is loaded it is compiled into a binary
+#form (levels/N.lvc) holding the packed tile array, the prebuilt
+#wall polygons, the baddie spawns and the goal.  Later loads read
+#the compiled form as long as it matches the source file and was
+#built from the same symbol table.
+import hashlib
+import os
+import struct
+import sys
+import tempfile
+
+#Symbol tables used to decode map files.
+#Format: symbol: [model path, heading, solid1 x1,x2,y1,y2, solid2 x1,x2,y1,y2]
+#Solid coordinates are in half tiles relative to the tile center.
+mapSymbols = \
+{"^":["models/building_side1",   90, -1, 1, 1, 1,  0, 0, 0, 0 ],
+ "%":["models/building_side2",	0, -1, 1, 1, 1,  0, 0, 0, 0 ],
+ "[":["models/building_side1",  180,  0, 0, 0 ,0, -1,-1,-1, 1 ],
+ "{":["models/building_side2",   90,  0, 0, 0, 0, -1,-1,-1, 1 ],
+ "_":["models/building_side1",  270, -1, 1,-1,-1,  0, 0, 0, 0 ],
+ "=":["models/building_side2",  180, -1, 1,-1,-1,  0, 0, 0, 0 ],
+ "]":["models/building_side1",	0,  0, 0, 0, 0,  1, 1,-1, 1 ],
+ "}":["models/building_side2",  270,  0, 0, 0, 0,  1, 1,-1, 1 ],
+ "+":["models/building_corner",  90, -1, 1, 1, 1, -1,-1, 1,-1 ],
+ "|":["models/building_corner", 180, -1, 1,-1,-1, -1,-1,-1, 1 ],
+ "#":["models/building_corner", 270, -1, 1,-1,-1,  1, 1,-1, 1 ],
+ "-":["models/building_corner",   0, -1, 1, 1, 1,  1, 1,-1, 1 ],
+ "*":["models/building_roof",	 0,  0, 0, 0, 0, 0, 0, 0, 0 ],
+ ">":["models/road",			 90,  0, 0, 0, 0, 0, 0, 0, 0 ],
+ "<":["models/road",			270,  0, 0, 0, 0, 0, 0, 0, 0 ],
+ "/":["models/road",			  0,  0, 0, 0, 0, 0, 0, 0, 0 ],
+ "\\":["models/road",		   180,  0, 0, 0, 0, 0, 0, 0, 0 ],
+ }
+
+#Size of a tile in world units, and the scale applied to
+#the half tile units used by mapSymbols.
+tileSize = 4
+tileScale = 2
+
+magic = b"TLBL"
+version = 2
+headerFormat = "<4sHdQ20s20s"
+#The compiled walls are built from the symbol table and tile sizes,
+#so a compiled level made with different ones is rebuilt.
+symbolsDigest = hashlib.sha1(repr((sorted(mapSymbols.items()),tileSize,tileScale)).encode()).digest()
+polygonFormat = "<12f"
+
+class Level:
+	def __init__(self):
+		self.name = ""
+		self.numCols = 0
+		self.numRows = 0
+		self.goalTile = (0,0)
+		self.truckStart = (0,0,0)
+		#List of (column, row, heading, symbol)
+		self.baddieStarts = []
+		#One symbol byte per tile, row by row.  Zero means no tile.
+		self.tiles = b""
+		#Map of (column, row) to a list of wall polygons, each
+		#polygon being a tuple of four (x,y,z) points.
+		self.walls = {}
+
+	def getTileSymbol(self,col_index,row_index):
+		c = self.tiles[row_index*self.numCols+col_index]
+		if c == 0:
+			return None
+		return chr(c)
+
+	@staticmethod
+	def getCachePath(mapPath):
+		return os.path.splitext(mapPath)[0] + ".lvc"
+
+	@staticmethod
+	def load(mapPath):
+		cachePath = Level.getCachePath(mapPath)
+		fp = open(mapPath,"rb")
+		stat = os.fstat(fp.fileno())
+		try:
+			level = Level.readCompiled(cachePath,stat,fp)
+		except (IOError,struct.error,ValueError):
+			level = None
+		if level == None:
+			fp.seek(0)
+			source = fp.read()
+			level = Level.parse(source)
+			try:
+				Level.writeCompiled(cachePath,level,stat,hashlib.sha1(source).digest())
+			except IOError:
+				pass
+		fp.close()
+		return level
+
+	@staticmethod
+	def parse(source):
+		level = Level()
+		lines = source.decode().split("\n")
+
+		try:
+			read_text = lines[0].strip().split(":")
+			level.name = read_text[0]
+			num_col = int(read_text[1])
+			num_row = int(read_text[2])
+			num_baddies = int(read_text[3])
+		except Exception:
+			raise IOError("Could not interpret map description line: %s" % repr(lines[0]))
+		level.numCols = num_col
+		level.numRows = num_row
+
+		try:
+			col_index, row_index = [int(x) for x in lines[1].strip().split(":")]
+			level.goalTile = (col_index,row_index)
+		except Exception:
+			raise IOError("Could not interpret goal information: %s" % repr(lines[1]))
+
+		try:
+			col_index, row_index, heading = [int(x) for x in lines[2].strip().split(":")]
+			level.truckStart = (col_index,row_index,heading)
+		except Exception:
+			raise IOError("Could not interpret truck start info: %s" % repr(lines[2]))
+
+		for i in range(num_baddies):
+			try:
+				read_text = lines[3+i]
+				baddie_start = read_text.strip().split(":")
+				level.baddieStarts.append( (int(baddie_start[0]),
+											int(baddie_start[1]),
+											int(baddie_start[2]),
+											baddie_start[3]) )
+			except Exception:
+				raise IOError("Could not interpret Baddie info: %s" % repr(read_text))
+
+		tiles = bytearray(num_col*num_row)
+		lines = lines[3+num_baddies:]
+		for row_index in range(num_row):
+			line = lines[row_index]
+			for col_index in range(num_col):
+				c = line[col_index]
+				try:
+					tile_info = mapSymbols[c]
+				except KeyError:
+					print("%d:%d %s" % (row_index,col_index,repr(c)))
+				else:
+					tiles[row_index*num_col+col_index] = ord(c)
+					polygons = Level.buildWalls(col_index,row_index,tile_info)
+					if len(polygons):
+						level.walls[(col_index,row_index)] = polygons
+		level.tiles = bytes(tiles)
+		return level
+
+	@staticmethod
+	def buildWalls(col_index,row_index,tile_info):
+		tile_x = 2+tileSize*col_index
+		tile_y = -1*(2+tileSize*row_index)
+		solid1_info = tile_info[2:6]
+		solid2_info = tile_info[6:10]
+		polygons = []
+		if sum(solid1_info) != 0:
+			solid_info = [tileScale*x for x in solid1_info]
+			polygons.append( ((tile_x+solid_info[0],tile_y+solid_info[2],0),
+							  (tile_x+solid_info[1],tile_y+solid_info[2],0),
+							  (tile_x+solid_info[1],tile_y+solid_info[3],1),
+							  (tile_x+solid_info[0],tile_y+solid_info[3],1)) )
+		if sum(solid2_info) != 0:
+			solid_info = [tileScale*x for x in solid2_info]
+			polygons.append( ((tile_x+solid_info[0],tile_y+solid_info[2],0),
+							  (tile_x+solid_info[1],tile_y+solid_info[2],1),
+							  (tile_x+solid_info[1],tile_y+solid_info[3],1),
+							  (tile_x+solid_info[0],tile_y+solid_info[3],0)) )
+		return polygons
+
+	@staticmethod
+	def readCompiled(cachePath,stat,sourceFp):
+		if not os.path.exists(cachePath):
+			return None
+		fp = open(cachePath,"rb")
+		data = fp.read()
+		fp.close()
+
+		offset = 0
+		fileMagic, fileVersion, mtime, size, digest, fileSymbolsDigest = struct.unpack_from(headerFormat,data,offset)
+		offset += struct.calcsize(headerFormat)
+		if fileMagic != magic or fileVersion != version or fileSymbolsDigest != symbolsDigest:
+			return None
+		if mtime != stat.st_mtime or size != stat.st_size:
+			#The source has been touched, so only trust the
+			#compiled form if the contents are unchanged.
+			if size != stat.st_size or hashlib.sha1(sourceFp.read()).digest() != digest:
+				return None
+			#Record the new modification time so later loads
+			#don't hash the source again
+			header = struct.pack(headerFormat,magic,version,stat.st_mtime,stat.st_size,digest,symbolsDigest)
+			try:
+				Level.replaceCompiled(cachePath,header+data[offset:])
+			except IOError:
+				pass
+
+		level = Level()
+		nameLength, = struct.unpack_from("<H",data,offset)
+		offset += 2
+		level.name = data[offset:offset+nameLength].decode()
+		offset += nameLength
+
+		num_col, num_row, num_baddies, goal_col, goal_row, truck_col, truck_row, truck_h = \
+			struct.unpack_from("<HHHhhhhh",data,offset)
+		offset += struct.calcsize("<HHHhhhhh")
+		level.numCols = num_col
+		level.numRows = num_row
+		level.goalTile = (goal_col,goal_row)
+		level.truckStart = (truck_col,truck_row,truck_h)
+
+		for i in range(num_baddies):
+			col_index, row_index, heading, symbol = struct.unpack_from("<hhhc",data,offset)
+			offset += struct.calcsize("<hhhc")
+			level.baddieStarts.append((col_index,row_index,heading,symbol.decode()))
+
+		level.tiles = data[offset:offset+num_col*num_row]
+		offset += num_col*num_row
+
+		num_walls, = struct.unpack_from("<I",data,offset)
+		offset += 4
+		polygonSize = struct.calcsize(polygonFormat)
+		for i in range(num_walls):
+			col_index, row_index, num_polygons = struct.unpack_from("<HHB",data,offset)
+			offset += struct.calcsize("<HHB")
+			polygons = []
+			for j in range(num_polygons):
+				v = struct.unpack_from(polygonFormat,data,offset)
+				offset += polygonSize
+				polygons.append( (v[0:3],v[3:6],v[6:9],v[9:12]) )
+			level.walls[(col_index,row_index)] = polygons
+		return level
+
+	@staticmethod
+	def writeCompiled(cachePath,level,stat,digest):
+		chunks = [struct.pack(headerFormat,magic,version,stat.st_mtime,stat.st_size,digest,symbolsDigest)]
+		name = level.name.encode()
+		chunks.append(struct.pack("<H",len(name)))
+		chunks.append(name)
+		chunks.append(struct.pack("<HHHhhhhh",
+								  level.numCols,level.numRows,len(level.baddieStarts),
+								  level.goalTile[0],level.goalTile[1],
+								  level.truckStart[0],level.truckStart[1],level.truckStart[2]))
+		for col_index, row_index, heading, symbol in level.baddieStarts:
+			chunks.append(struct.pack("<hhhc",col_index,row_index,heading,symbol.encode()))
+		chunks.append(level.tiles)
+		chunks.append(struct.pack("<I",len(level.walls)))
+		for (col_index,row_index), polygons in sorted(level.walls.items()):
+			chunks.append(struct.pack("<HHB",col_index,row_index,len(polygons)))
+			for polygon in polygons:
+				chunks.append(struct.pack(polygonFormat,*[v for point in polygon for v in point]))
+
+		Level.replaceCompiled(cachePath,b"".join(chunks))
+
+	@staticmethod
+	def replaceCompiled(cachePath,data):
+		#Write to a temporary file of our own first, so a partially
+		#written cache is never picked up by another load and loads
+		#in other processes writing the same cache don't collide.
+		fd, tmpPath = tempfile.mkstemp(dir=os.path.dirname(cachePath) or ".",suffix=".tmp")
+		try:
+			fp = os.fdopen(fd,"wb")
+			fp.write(data)
+			fp.close()
+			os.replace(tmpPath,cachePath)
+		except Exception:
+			os.remove(tmpPath)
+			raise
+
+def main():
+	if len(sys.argv) > 1:
+		paths = sys.argv[1:]
+	else:
+		paths = sorted(os.path.join("levels",name) for name in os.listdir("levels") if name.endswith(".txt"))
+	for mapPath in paths:
+		fp = open(mapPath,"rb")
+		source = fp.read()
+		stat = os.fstat(fp.fileno())
+		fp.close()
+		level = Level.parse(source)
+		digest = hashlib.sha1(source).digest()
+		Level.writeCompiled(Level.getCachePath(mapPath),level,stat,digest)
+		print("%s -> %s" % (mapPath,Level.getCachePath(mapPath)))
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,104 @@
+import threading
+from direct.task import Task
+from pandac.PandaModules import NodePath
+from Level import Level
+from Map import Map
+import assets
+
+class LevelPreloader:
+	#Gets the next level ready while the winner screen is up.  The
+	#level file is read on a worker thread, its models and actors
+	#are loaded on Panda3D's asynchronous loader, and then its Map
+	#is built off screen by a task.  When the player moves on,
+	#take() hands over the built Map, first finishing anything
+	#that is still to do.
+	def __init__(self,world):
+		self.world = world
+		self.task = None
+		#Bumped by cancel() so that a worker thread or loader
+		#callback left over from an earlier start() is ignored
+		self.generation = 0
+		self.cancel()
+
+	def cancel(self):
+		if self.task != None:
+			taskMgr.remove(self.task)
+			self.task = None
+		self.generation += 1
+		self.mapPath = None
+		self.name = None
+		self.thread = None
+		self.level = None
+		self.isParsed = False
+		self.isRequested = False
+		self.isLoaded = False
+		self.map = None
+
+	def start(self,mapPath,name):
+		self.cancel()
+		self.mapPath = mapPath
+		self.name = name
+		self.thread = threading.Thread(target=self.parse,args=(mapPath,self.generation))
+		self.thread.daemon = True
+		self.thread.start()
+		self.task = taskMgr.add(self.update,"levelPreloader")
+
+	def parse(self,mapPath,generation):
+		#Runs on the worker thread.  A level that fails to parse
+		#is left for take() to report by loading it normally.
+		try:
+			level = Level.load(mapPath)
+		except IOError:
+			level = None
+		if generation == self.generation:
+			self.level = level
+			self.isParsed = True
+
+	def update(self,task):
+		if not self.isParsed:
+			return Task.cont
+		if self.level == None:
+			self.task = None
+			return Task.done
+		if not self.isRequested:
+			#Everything the next level uses from here on
+			#counts as used when the old level's are evicted
+			self.isRequested = True
+			assets.beginLevel()
+			models, actorSpecs = Map.getAssets(self.level)
+			assets.preload(models,actorSpecs,self.setLoaded,[self.generation])
+			return Task.cont
+		if not self.isLoaded:
+			return Task.cont
+		self.build()
+		self.task = None
+		return Task.done
+
+	def setLoaded(self,generation):
+		if generation == self.generation:
+			self.isLoaded = True
+
+	def build(self):
+		map = Map(self.world)
+		map.build(NodePath(self.name),self.level)
+		self.map = map
+
+	def take(self,mapPath):
+		#The built Map for mapPath, or None if mapPath isn't the
+		#level being preloaded or it couldn't be read.
+		if mapPath != self.mapPath or self.thread == None:
+			self.cancel()
+			return None
+		self.thread.join()
+		if self.level == None:
+			self.cancel()
+			return None
+		if self.map == None:
+			#Any model the asynchronous loader hasn't
+			#got to yet is loaded as it is needed
+			if not self.isRequested:
+				assets.beginLevel()
+			self.build()
+		map = self.map
+		self.cancel()
+		return map
@@ -1,194 +1,300 @@
 from direct.showbase.Loader import Loader
 from pandac.PandaModules import Point3
-from pandac.PandaModules import CollisionNode,CollisionPolygon, CollisionSphere, BitMask32
+from pandac.PandaModules import CollisionNode, CollisionSphere, BitMask32
 from pandac.PandaModules import TransparencyAttrib
-from Baddie import Baddie,RightTurnBaddie,LeftTurnBaddie,BouncingBaddie,StationaryBaddie
+from Level import Level,mapSymbols
+from Baddie import Baddie,RightTurnBaddie,LeftTurnBaddie,BouncingBaddie,StationaryBaddie,PursuingBaddie
 from Truck import Truck
-
-mapSymbols = \
-{"^":["models/building_side1",   90, -1, 1, 1, 1,  0, 0, 0, 0 ],
- "%":["models/building_side2",	0, -1, 1, 1, 1,  0, 0, 0, 0 ],
- "[":["models/building_side1",  180,  0, 0, 0 ,0, -1,-1,-1, 1 ],
- "{":["models/building_side2",   90,  0, 0, 0, 0, -1,-1,-1, 1 ],
- "_":["models/building_side1",  270, -1, 1,-1,-1,  0, 0, 0, 0 ],
- "=":["models/building_side2",  180, -1, 1,-1,-1,  0, 0, 0, 0 ],
- "]":["models/building_side1",	0,  0, 0, 0, 0,  1, 1,-1, 1 ],
- "}":["models/building_side2",  270,  0, 0, 0, 0,  1, 1,-1, 1 ],
- "+":["models/building_corner",  90, -1, 1, 1, 1, -1,-1, 1,-1 ],
- "|":["models/building_corner", 180, -1, 1,-1,-1, -1,-1,-1, 1 ],
- "#":["models/building_corner", 270, -1, 1,-1,-1,  1, 1,-1, 1 ],
- "-":["models/building_corner",   0, -1, 1, 1, 1,  1, 1,-1, 1 ],
- "*":["models/building_roof",	 0,  0, 0, 0, 0, 0, 0, 0, 0 ],	 
- ">":["models/road",			 90,  0, 0, 0, 0, 0, 0, 0, 0 ],
- "<":["models/road",			270,  0, 0, 0, 0, 0, 0, 0, 0 ],
- "/":["models/road",			  0,  0, 0, 0, 0, 0, 0, 0, 0 ],
- "\\":["models/road",		   180,  0, 0, 0, 0, 0, 0, 0, 0 ],
- }
+from SpatialGrid import SpatialGrid
+from NavGraph import NavGraph
+import assets
+import numpy
+import time
 
 baddieSymbols = \
 {"s":StationaryBaddie,
  "r":RightTurnBaddie,
  "l":LeftTurnBaddie,
- "b":BouncingBaddie}
+ "b":BouncingBaddie,
+ "p":PursuingBaddie}
 
 class Map:
+	#Static tiles are batched into square chunks of chunkSize
+	#tiles per side.  Within a chunk the tiles are grouped by
+	#texture and each group is flattened into combined geometry.
+	#Chunks are built and attached when they come within
+	#viewDistance tiles of the truck, detached when they leave
+	#it and released entirely beyond unloadDistance tiles.
+	chunkSize = 8
+	viewDistance = 16
+	unloadDistance = 32
+	#Map of tile model path to the key its chunk batch is made
+	#under, shared by every level.
+	textureKeys = {}
+
 	def __init__(self,world):
 		self.world = world
+		self.head = None
+		self.level = None
+		#Per column and row, the tile's walls as segments
+		#x1,y1,x2,y2 along their feet, or None
 		self.tileWallMap = []
+		self.wallGrid = None
+		self.reserveGrid = None
+		self.nav = None
+		self.grid = None
+		self.chunkTiles = {}
+		self.chunks = {}
+		self.activeChunks = set()
+		self.viewTile = None
 		self.name = ""
+		#Seconds spent in each part of loading the level
+		self.loadTimes = {}
 
 	def getName(self):
 		return self.name
 		
+	@staticmethod
+	def getAssets(level):
+		#Model paths, and actor paths with their animations,
+		#that the level is going to ask the assets module for.
+		symbols = set(level.tiles)
+		symbols.discard(0)
+		models = sorted(set(mapSymbols[chr(c)][0] for c in symbols))
+		models += ["models/goal","models/desertsky","models/ground"]
+		actors = [Truck.actor,Truck.explosionActor]
+		if level.baddieStarts:
+			actors.append(Baddie.actor)
+		return models, actors
+
 	def load(self,head,mapPath):
+		startTime = time.perf_counter()
+		level = Level.load(mapPath)
+		parseTime = time.perf_counter()-startTime
+		self.build(head,level)
+		self.loadTimes["parse"] = parseTime
+		return self.populate()
+
+	def build(self,head,level):
+		#Everything of the level that doesn't move: tiles, walls,
+		#the goal, sky and ground.  The map can be built off screen
+		#before the world is ready for its truck and baddies.
 		scale = 2
-		fp = open(mapPath,"rb")
-		data = fp.read().decode()
-		fp.close()
-		lines = data.split("\n")
-
-		try:
-			read_text = lines[0]
-			read_text = lines[0].strip().split(":")
-			self.name = read_text[0]
-			num_col = int(read_text[1])
-			num_row = int(read_text[2])
-			num_baddies = int(read_text[3])
-			tileWallMap = [[ None for r in range(num_row)] for c in range(num_col)]
-		except Exception:
-			raise IOError("Could not interpret map description line: %s" % repr(lines[0]))
-
-		try:
-			read_text = lines[1]
-			goal_tile = [int(x) for x in read_text.strip().split(":")]
-		except Exception:
-			raise IOError("Could not interpret goal information: %s" % repr(lines[1]))
-
-		try:
-			read_text = lines[2]
-			read_text = read_text.strip().split(":")
-			truckStart  = [int(x) for x in read_text]
-			truckPosition = self.getTilePos(truckStart[0],truckStart[1])
-			truck = Truck(self.world,head,
-						  truckStart[0],truckStart[1],
-						  truckStart[2])
-		except Exception:
-			raise IOError("Could not interpret truch start info: %s" % repr(lines[2]))
-
-		Baddie.resetIds()
-		baddies = []
-		self.baddiesStart = []
-		for i in range(num_baddies):
-			try:
-				read_text = lines[3+i]
-				baddie_start = read_text.strip().split(":")
-				baddie = baddieSymbols[baddie_start[3]](self.world,head,
-															 int(baddie_start[0]),
-															 int(baddie_start[1]),
-															 int(baddie_start[2]) )
-				baddies.append(baddie)
-			except Exception:
-				raise IOError("Could not interpret Baddie info: %s" % repr(read_text))
+		startTime = time.perf_counter()
+		self.level = level
+		self.name = level.name
+		num_col = level.numCols
+		num_row = level.numRows
+		tileWallMap = [[ None for r in range(num_row)] for c in range(num_col)]
+		#The same walls as an array, for baddies thinking in bulk,
+		#and the number of baddies heading for each tile.
+		wallGrid = numpy.zeros((num_col,num_row),numpy.bool_)
+		reserveGrid = numpy.zeros((num_col,num_row),numpy.int32)
 
-		lines = lines[3+num_baddies:]
+		truckStart = level.truckStart
+		truckPosition = self.getTilePos(truckStart[0],truckStart[1])
+
+		chunkTiles = {}
+		goalPosition = None
 		for row_index in range(num_row):
-			line = lines[row_index]
 			for col_index in range(num_col):
+				c = level.getTileSymbol(col_index,row_index)
+				if c == None:
+					continue
+				tile_info = mapSymbols[c]
 				tilePosition = self.getTilePos(col_index,row_index)
 
-				c = line[col_index]
-				try:
-					tile_info = mapSymbols[c]
-				except KeyError:
-					print("%d:%d %s" % (row_index,col_index,repr(c)))
-				else:
-					#Load up the model for this tile
-					#and set it to render
-					model_path = tile_info[0]
-					rotation = tile_info[1]
-					tile = loader.loadModelCopy(model_path)
-					tile.setScale(scale)
-					tile.setPos(tilePosition)
-					tile.setH(rotation)
-					tile.reparentTo(head)
-					
-					#Setup collision solids for this tile
-					solid1_info = tile_info[2:6]
-					solid2_info = tile_info[6:10]
-					new_solids = []
-					tile_x = tilePosition.getX()
-					tile_y = tilePosition.getY()
-					
-					if sum(solid1_info) != 0:
-						solid_info = [scale*x for x in solid1_info]
-						new_solid = CollisionPolygon( Point3(tile_x+solid_info[0],tile_y+solid_info[2],0),
-													  Point3(tile_x+solid_info[1],tile_y+solid_info[2],0),
-													  Point3(tile_x+solid_info[1],tile_y+solid_info[3],1),
-													  Point3(tile_x+solid_info[0],tile_y+solid_info[3],1) )
-						new_solids.append(new_solid)
-					if sum(solid2_info) != 0:
-						solid_info = [scale*x for x in solid2_info]
-						new_solid = CollisionPolygon( Point3(tile_x+solid_info[0],tile_y+solid_info[2],0),
-													  Point3(tile_x+solid_info[1],tile_y+solid_info[2],1),
-													  Point3(tile_x+solid_info[1],tile_y+solid_info[3],1),
-													  Point3(tile_x+solid_info[0],tile_y+solid_info[3],0) )
-						new_solids.append(new_solid)
-					if len(new_solids):
-						solidNode = CollisionNode("tile solid %d:%d" % (col_index,row_index))
-						for solid in new_solids:
-							solidNode.addSolid(solid)
-						solidNode.setFromCollideMask(BitMask32(0x0))
-						solidNode.setIntoCollideMask(BitMask32(0x0))
-						head.attachNewNode(solidNode)
-						tileWallMap[col_index][row_index] = solidNode
-
-					if [col_index,row_index] == goal_tile:
-						goalNp = loader.loadModelCopy("models/goal")
-						goalNp.setTransparency(TransparencyAttrib.MAlpha)
-						goalNp.setColor(0,1,0,0.5)
-						goalNp.setScale(2*scale)
-						goalNp.setPos( Point3(tile_x,tile_y,0) )
-						goalNp.reparentTo(head)
-						goalCollisionNode = CollisionNode("goal")
-						goalCollisionNode.addSolid(CollisionSphere(0,0,0,0.5))
-						goalNp.attachNewNode(goalCollisionNode)
-						goalNp.setCollideMask(BitMask32(0x0))
-						goalCollisionNode.setFromCollideMask(BitMask32(0x0))
-						goalCollisionNode.setIntoCollideMask(BitMask32(0x1))
+				#Record the model for this tile in its chunk.
+				#It is loaded when the chunk comes into view.
+				model_path = tile_info[0]
+				rotation = tile_info[1]
+				chunkKey = (col_index//Map.chunkSize, row_index//Map.chunkSize)
+				chunkTiles.setdefault(chunkKey,[]).append((model_path,tilePosition,rotation))
+
+				#The truck collides with the walls of this tile as the
+				#segments x1,y1,x2,y2 along the foot of each wall polygon
+				polygons = level.walls.get((col_index,row_index))
+				if polygons != None:
+					tileWallMap[col_index][row_index] = \
+						[(polygon[0][0],polygon[0][1],polygon[2][0],polygon[2][1]) for polygon in polygons]
+					wallGrid[col_index,row_index] = True
+
+				if (col_index,row_index) == level.goalTile:
+					goalPosition = tilePosition
+		self.nav = NavGraph(wallGrid)
+		collisionTime = time.perf_counter()-startTime
+
+		startTime = time.perf_counter()
+		if goalPosition != None:
+			goalNp = assets.loadModel("models/goal")
+			goalNp.setTransparency(TransparencyAttrib.MAlpha)
+			goalNp.setColor(0,1,0,0.5)
+			goalNp.setScale(2*scale)
+			goalNp.setPos(goalPosition)
+			goalNp.reparentTo(head)
+			goalCollisionNode = CollisionNode("goal")
+			goalCollisionNode.addSolid(CollisionSphere(0,0,0,0.5))
+			goalNp.attachNewNode(goalCollisionNode)
+			goalNp.setCollideMask(BitMask32(0x0))
+			goalCollisionNode.setFromCollideMask(BitMask32(0x0))
+			goalCollisionNode.setIntoCollideMask(BitMask32(0x1))
 
 		mapCenter = Point3(2+4*(num_col/2),-1*(2+4*num_row/2),-0.25)
-		sky = loader.loadModel("models/desertsky")
+		sky = assets.loadModel("models/desertsky")
 		sky.setPos(mapCenter)
 		sky.setScale(0.25)
 		sky.reparentTo(head)
-		ground = loader.loadModel("models/ground")
+		ground = assets.loadModel("models/ground")
 		ground.setPos(mapCenter)
 		ground.setScale(300)
 		ground.reparentTo(head)
 
+		self.head = head
 		self.tileWallMap = tileWallMap
+		self.wallGrid = wallGrid
+		self.reserveGrid = reserveGrid
+		self.chunkTiles = chunkTiles
+		self.chunks = {}
+		self.activeChunks = set()
+		self.viewTile = None
+		self.updateView(truckPosition)
+		#The tile walls, grids and navigation graph against the
+		#goal, sky, ground and the tile chunks in view
+		self.loadTimes = {"collision":collisionTime,
+						  "models":time.perf_counter()-startTime}
+
+	def populate(self):
+		#Create the truck and baddies of the built level
+		#in the world, which must be ready for them.
+		startTime = time.perf_counter()
+		level = self.level
+		head = self.head
+		truckStart = level.truckStart
+		pool = self.world.pool
+		truck = pool.acquire(Truck,self.world,head,
+							 truckStart[0],truckStart[1],
+							 truckStart[2])
+
+		self.grid = SpatialGrid(self)
+		baddies = []
+		for baddie_start in level.baddieStarts:
+			try:
+				baddie = pool.acquire(baddieSymbols[baddie_start[3]],self.world,head,
+									  baddie_start[0],
+									  baddie_start[1],
+									  baddie_start[2])
+				baddies.append(baddie)
+			except KeyError:
+				raise IOError("Could not interpret Baddie info: %s" % repr(baddie_start))
+		self.loadTimes["populate"] = time.perf_counter()-startTime
 		return (truck,baddies)
 
+	def updateView(self,position):
+		tile = self.getTile(position)
+		if tile == self.viewTile:
+			return
+		self.viewTile = tile
+		#Baddies chasing the truck follow it tile by tile as well
+		self.nav.setGoal(*tile)
+
+		visible = self.getChunksInRange(tile,Map.viewDistance)
+		for key in self.activeChunks - visible:
+			self.chunks[key].detachNode()
+		for key in visible - self.activeChunks:
+			chunk = self.chunks.get(key)
+			if chunk == None:
+				chunk = self.loadChunk(key)
+			chunk.reparentTo(self.head)
+		self.activeChunks = visible
+
+		loaded = self.getChunksInRange(tile,Map.unloadDistance)
+		for key in [key for key in self.chunks if key not in loaded]:
+			self.chunks.pop(key).removeNode()
+
+	def getChunksInRange(self,tile,distance):
+		c, r = tile
+		size = Map.chunkSize
+		keys = set()
+		for chunkCol in range((c-distance)//size,(c+distance)//size+1):
+			for chunkRow in range((r-distance)//size,(r+distance)//size+1):
+				if (chunkCol,chunkRow) in self.chunkTiles:
+					keys.add((chunkCol,chunkRow))
+		return keys
+
+	def loadChunk(self,key):
+		scale = 2
+		chunk = self.head.attachNewNode("chunk %d:%d" % key)
+		batches = {}
+		for model_path, tilePosition, rotation in self.chunkTiles[key]:
+			tile = assets.loadModel(model_path)
+			tile.setScale(scale)
+			tile.setPos(tilePosition)
+			tile.setH(rotation)
+			tile.reparentTo(self.getBatch(batches,chunk,model_path,tile))
+
+		#Merge each texture batch into a single piece of geometry
+		for batch in batches.values():
+			batch.clearModelNodes()
+			batch.flattenStrong()
+		self.chunks[key] = chunk
+		return chunk
+
+	def getBatch(self,batches,chunk,model_path,tile):
+		#Tiles are batched by texture so that flattening
+		#can merge them into one Geom per texture.
+		key = self.textureKeys.get(model_path)
+		if key == None:
+			texture = tile.findTexture("*")
+			if texture != None:
+				key = texture.getName()
+			else:
+				key = model_path
+			self.textureKeys[model_path] = key
+		batch = batches.get(key)
+		if batch == None:
+			batch = chunk.attachNewNode(key)
+			batches[key] = batch
+		return batch
+
 	def getTile(self,position):
 		return( int(round((position.getX()-2.0)/4.0)), int(round((-1.0*(position.getY()+2.0))/4.0)) )
 	
 	def getTilePos(self,col_index,row_index):
 		return Point3(2+4*col_index,-1*(2+4*row_index),0)
 
-	def getTileWall(self,col_index,row_index):
-		return self.tileWallMap[col_index][row_index]
+	def isTileOpen(self,col_index,row_index):
+		#True if a baddie can head for the tile:
+		#it is on the map, not a wall and not reserved.
+		numCols, numRows = self.wallGrid.shape
+		if col_index < 0 or col_index >= numCols or row_index < 0 or row_index >= numRows:
+			return False
+		return not self.wallGrid[col_index,row_index] and not self.reserveGrid[col_index,row_index]
 
-	def getWalls(self,firstColumn,lastColumn,firstRow,lastRow):
-		cols = [firstColumn+x for x in range(lastColumn-firstColumn+1)]
-		rows = [firstRow+x for x in range(lastRow-firstRow+1)]
+	def reserveTile(self,col_index,row_index):
+		self.reserveGrid[col_index,row_index] += 1
+
+	def releaseTile(self,col_index,row_index):
+		self.reserveGrid[col_index,row_index] -= 1
+
+	def getWindowWalls(self,window,exclude):
+		#Walls of the tiles in window but not in exclude as
+		#(tile, segments).  Windows are (first column, last
+		#column, first row, last row) and exclude may be None.
+		firstColumn, lastColumn, firstRow, lastRow = window
+		firstColumn = max(firstColumn,0)
+		lastColumn = min(lastColumn,len(self.tileWallMap)-1)
+		firstRow = max(firstRow,0)
+		lastRow = min(lastRow,len(self.tileWallMap[0])-1)
 		walls = []
-		for c in cols:
-			if c < 0 or c >= len(self.tileWallMap):
-				continue
+		for c in range(firstColumn,lastColumn+1):
+			if exclude != None and exclude[0] <= c <= exclude[1]:
+				rows = list(range(firstRow,min(lastRow,exclude[2]-1)+1)) + \
+					   list(range(max(firstRow,exclude[3]+1),lastRow+1))
+			else:
+				rows = range(firstRow,lastRow+1)
+			column = self.tileWallMap[c]
 			for r in rows:
-				if r < 0 or r >= len(self.tileWallMap[0]):
-					continue
-				wall = self.tileWallMap[c][r]
+				wall = column[r]
 				if wall != None:
-					walls.append(wall)
-		return walls	
\ No newline at end of file
+					walls.append(((c,r),wall))
+		return walls
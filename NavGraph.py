@@ -0,0 +1,125 @@
+from collections import OrderedDict
+import numpy
+
+class NavGraph:
+	#Graph of the open tiles of a level, each linked to the open
+	#tiles beside it, built once when the level loads.  Baddies that
+	#chase the truck read the number of steps from their tile to the
+	#truck's tile out of a distance field instead of searching for
+	#a path themselves.
+	#
+	#The field for the truck's tile is worked out with one breadth
+	#first search the first time it is asked for after the truck
+	#moves onto the tile.  Fields are cached by tile, so a truck
+	#driving back over its own tracks costs nothing.  The cache holds
+	#up to cacheCells tiles worth of fields, which on small maps is
+	#every tile: the same as routing between all pairs of tiles.
+	#
+	#Alongside each field is a flow field: for every open tile the
+	#heading of its first step towards the truck.  It is worked out
+	#for the whole map in one pass over the distance field, so any
+	#number of baddies can steer by it for the price of a lookup.
+	cacheCells = 1<<20
+	#Tile offset for each map heading
+	headingOffsets = {  0:( 0,-1),
+					   90:( 1, 0),
+					  180:( 0, 1),
+					  270:(-1, 0)}
+
+	def __init__(self,wallGrid):
+		self.numCols, self.numRows = wallGrid.shape
+		numRows = self.numRows
+		isOpen = ~wallGrid
+		#Tiles are numbered column by column, c*numRows+r
+		self.neighbours = [[] for i in range(self.numCols*numRows)]
+		for c, r in zip(*numpy.nonzero(isOpen)):
+			c = int(c)
+			r = int(r)
+			links = self.neighbours[c*numRows+r]
+			for dc, dr in NavGraph.headingOffsets.values():
+				if 0 <= c+dc < self.numCols and 0 <= r+dr < numRows and isOpen[c+dc,r+dr]:
+					links.append((c+dc)*numRows+r+dr)
+		self.isOpen = isOpen
+		self.cacheSize = max(1,NavGraph.cacheCells//max(1,isOpen.size))
+		self.fields = OrderedDict()
+		self.goal = None
+		self.entry = None
+
+	def setGoal(self,col_index,row_index):
+		if (col_index,row_index) != self.goal:
+			self.goal = (col_index,row_index)
+			self.entry = None
+
+	def getEntry(self):
+		#[distance field, flow field] for the goal.  The flow
+		#field is only made once something asks for it.
+		if self.entry is None:
+			entry = self.fields.get(self.goal)
+			if entry is None:
+				entry = [self.search(*self.goal),None]
+				self.fields[self.goal] = entry
+				if len(self.fields) > self.cacheSize:
+					self.fields.popitem(last=False)
+			else:
+				self.fields.move_to_end(self.goal)
+			self.entry = entry
+		return self.entry
+
+	def getField(self):
+		#Distance in steps from every tile to the goal,
+		#or -1 where the goal can't be reached.
+		return self.getEntry()[0]
+
+	def getFlow(self):
+		#Map heading of the first step towards the goal from every
+		#tile, or -1 on walls, the goal and where it can't be reached.
+		entry = self.getEntry()
+		if entry[1] is None:
+			entry[1] = self.makeFlow(entry[0])
+		return entry[1]
+
+	def getDistance(self,col_index,row_index):
+		if 0 <= col_index < self.numCols and 0 <= row_index < self.numRows:
+			return int(self.getField()[col_index,row_index])
+		return -1
+
+	def getFlowHeading(self,col_index,row_index):
+		if 0 <= col_index < self.numCols and 0 <= row_index < self.numRows:
+			return int(self.getFlow()[col_index,row_index])
+		return -1
+
+	def makeFlow(self,field):
+		#Each tile steps to the neighbour closest to the goal,
+		#the first in heading order where there is a tie.
+		numCols, numRows = field.shape
+		padded = numpy.full((numCols+2,numRows+2),-1,numpy.int32)
+		padded[1:-1,1:-1] = field
+		farthest = numpy.iinfo(numpy.int32).max
+		headings = sorted(NavGraph.headingOffsets)
+		steps = numpy.empty((len(headings),numCols,numRows),numpy.int32)
+		for k, heading in enumerate(headings):
+			dc, dr = NavGraph.headingOffsets[heading]
+			neighbour = padded[1+dc:1+dc+numCols,1+dr:1+dr+numRows]
+			steps[k] = numpy.where(neighbour >= 0,neighbour,farthest)
+		best = steps.argmin(axis=0)
+		isCloser = (field > 0) & (steps.min(axis=0) < field)
+		return numpy.where(isCloser,numpy.array(headings)[best],-1).astype(numpy.int16)
+
+	def search(self,col_index,row_index):
+		distance = [-1]*(self.numCols*self.numRows)
+		if 0 <= col_index < self.numCols and 0 <= row_index < self.numRows and self.isOpen[col_index,row_index]:
+			neighbours = self.neighbours
+			start = col_index*self.numRows+row_index
+			distance[start] = 0
+			frontier = [start]
+			steps = 0
+			while frontier:
+				steps += 1
+				nextFrontier = []
+				for node in frontier:
+					for other in neighbours[node]:
+						if distance[other] < 0:
+							distance[other] = steps
+							nextFrontier.append(other)
+				frontier = nextFrontier
+		return numpy.array(distance,numpy.int32).reshape(self.numCols,self.numRows)
@@ -0,0 +1,24 @@
+class ObjectPool:
+	#Keeps the truck and baddies of a finished level so that later
+	#levels can use them again, actors and collision nodes
+	#included, instead of making new ones.  Objects are kept by
+	#class.  release() must leave an object with no event hooks,
+	#colliders, intervals or scheduled work, and reuse() sets it up
+	#on the new level ready for its reset().
+	def __init__(self):
+		self.free = {}
+
+	def acquire(self,cls,world,parent,*startInfo):
+		free = self.free.get(cls)
+		if free:
+			obj = free.pop()
+			obj.reuse(world,parent,*startInfo)
+			return obj
+		return cls(world,parent,*startInfo)
+
+	def release(self,obj):
+		obj.release()
+		self.free.setdefault(obj.__class__,[]).append(obj)
+
+	def getCount(self):
+		return sum([len(free) for free in self.free.values()])
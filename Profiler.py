@@ -0,0 +1,167 @@
+import os
+import time
+from collections import deque
+from direct.task import Task
+from direct.gui.OnscreenText import OnscreenText
+from direct.interval.IntervalGlobal import ivalMgr
+from pandac.PandaModules import PythonCallbackObject, TextNode
+
+class Profiler:
+	#Frame timing that can be turned on and off while the game runs.
+	#The parts of the game wrap their work in start() and stop(), and
+	#count things with count(), which cost next to nothing while the
+	#profiler is off.  Rendering is timed by cull and draw callbacks
+	#on each display region.  At the end of every frame the totals go
+	#to an on screen overlay, averaged over overlayFrames frames, and
+	#as a row to a CSV file.  The CSV file rolls over to csvPath.1
+	#every csvRows rows, so it never holds more than two files' worth.
+	#
+	#Sections timed, in milliseconds per frame
+	sections = ("truck.walls","truck.move",
+				"baddies","baddies.think",
+				"traverse","grid",
+				"render.left","render.center","render.right")
+	#Things counted per frame.  pooled is the number of trucks
+	#and baddies kept in the world's pool for later levels.
+	counts = ("steps","wallSegments","collisions","timers","intervals","pooled")
+	overlayFrames = 30
+	csvPath = "profile.csv"
+	csvRows = 10000
+
+	def __init__(self,world):
+		self.world = world
+		self.isEnabled = False
+		self.task = None
+		self.overlay = None
+		self.csvFile = None
+		self.regions = []
+		self.clear()
+
+	def clear(self):
+		self.times = dict.fromkeys(Profiler.sections,0.0)
+		self.counters = dict.fromkeys(Profiler.counts,0)
+
+	def toggle(self):
+		if self.isEnabled:
+			self.disable()
+		else:
+			self.enable()
+
+	def enable(self,csvPath=None):
+		if self.isEnabled:
+			return
+		self.isEnabled = True
+		self.clear()
+		self.history = deque(maxlen=Profiler.overlayFrames)
+		self.frameCount = 0
+		self.frameTime = time.perf_counter()
+		self.openCsv(csvPath or Profiler.csvPath)
+		if not self.world.headless:
+			self.hookRegions()
+			self.overlay = OnscreenText("",
+										parent=base.a2dTopLeft,
+										pos=(0.05,-0.08),
+										scale=0.045,
+										fg=(1,1,0,1),
+										align=TextNode.ALeft,
+										mayChange=True)
+		#After igLoop, which renders the frame
+		self.task = taskMgr.add(self.endFrame,"profiler",sort=60)
+
+	def disable(self):
+		if not self.isEnabled:
+			return
+		self.isEnabled = False
+		taskMgr.remove(self.task)
+		self.task = None
+		if not self.world.headless:
+			#The render budget may have made or removed
+			#inset buffers since the regions were hooked
+			for name, region in self.regions+self.world.renderBudget.getRegions():
+				region.clearCullCallback()
+				region.clearDrawCallback()
+		self.regions = []
+		if self.overlay != None:
+			self.overlay.destroy()
+			self.overlay = None
+		self.closeCsv()
+
+	def start(self):
+		#Start time for stop(), or None when off
+		if self.isEnabled:
+			return time.perf_counter()
+		return None
+
+	def stop(self,name,startTime):
+		if startTime != None:
+			self.times[name] += time.perf_counter()-startTime
+
+	def count(self,name,number=1):
+		if self.isEnabled:
+			self.counters[name] += number
+
+	def hookRegions(self):
+		#Including the inset buffers of the render budget
+		self.regions = self.world.renderBudget.getRegions()
+		for name, region in self.regions:
+			callback = PythonCallbackObject(self.makeRegionCallback("render."+name))
+			region.setCullCallback(callback)
+			region.setDrawCallback(callback)
+
+	def makeRegionCallback(self,name):
+		#Cull and draw of a region, done by upcall(), are both
+		#counted as rendering it
+		def renderRegion(cbdata):
+			startTime = time.perf_counter()
+			cbdata.upcall()
+			self.times[name] += time.perf_counter()-startTime
+		return renderRegion
+
+	def openCsv(self,path):
+		self.csvPath = path
+		self.csvFile = open(path,"w")
+		self.csvFile.write(",".join(("frame","frameMs")+Profiler.sections+Profiler.counts)+"\n")
+		self.csvCount = 0
+
+	def closeCsv(self):
+		if self.csvFile != None:
+			self.csvFile.close()
+			self.csvFile = None
+
+	def writeCsv(self,row):
+		if self.csvCount == Profiler.csvRows:
+			self.closeCsv()
+			os.replace(self.csvPath,self.csvPath+".1")
+			self.openCsv(self.csvPath)
+		self.csvFile.write(",".join(["%g" % value for value in row])+"\n")
+		self.csvCount += 1
+
+	def endFrame(self,task):
+		now = time.perf_counter()
+		frameMs = (now-self.frameTime)*1000.0
+		self.frameTime = now
+		self.counters["intervals"] = ivalMgr.getNumIntervals()
+		self.counters["pooled"] = self.world.pool.getCount()
+		times = [self.times[name]*1000.0 for name in Profiler.sections]
+		counts = [self.counters[name] for name in Profiler.counts]
+		row = [self.frameCount,frameMs]+times+counts
+		self.frameCount += 1
+		self.history.append(row)
+		self.writeCsv(row)
+		if self.overlay != None and self.frameCount % Profiler.overlayFrames == 0:
+			self.showOverlay()
+		self.clear()
+		return Task.cont
+
+	def showOverlay(self):
+		history = self.history
+		names = ("frame",)+Profiler.sections+Profiler.counts
+		lines = []
+		for k, name in enumerate(names):
+			column = [row[k+1] for row in history]
+			mean = sum(column)/len(column)
+			if k <= len(Profiler.sections):
+				lines.append("%-14s %6.2f ms  max %6.2f" % (name,mean,max(column)))
+			else:
+				lines.append("%-14s %6.1f  max %d" % (name,mean,max(column)))
+		self.overlay.setText("\n".join(lines))
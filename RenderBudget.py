@@ -0,0 +1,218 @@
+import math
+from direct.task import Task
+from pandac.PandaModules import CardMaker, ClockObject, ConfigVariableBool, ConfigVariableDouble, Fog, FogAttrib, RenderState, VBase4
+from Level import tileSize
+from Map import Map
+
+class RenderBudget:
+	#Keeps the frame rate up on slow machines by rendering the two
+	#inset views more cheaply.  The cheaper tiers render the insets
+	#into offscreen buffers shown on cards where the insets were, so
+	#a buffer that isn't rendered on a frame keeps its last picture.
+	#
+	#Each tier is (frames between renders of each inset, buffer size
+	#as a fraction of the inset, whether the side cameras are cut
+	#short).  Insets updated every other frame take turns, so one
+	#of them is rendered each frame.  Side cameras cut short see
+	#no further than the map shows tiles, which leaves out the sky,
+	#so they fade into a haze the colour of the sky before they get
+	#there.  They also use lodScale on any level of detail nodes.
+	tiers = ((1,1.0,False),
+			 (2,1.0,False),
+			 (2,1.0,True),
+			 (2,0.5,True))
+	farDistance = Map.viewDistance*tileSize
+	lodScale = 0.5
+	hazeColor = VBase4(0.96,0.89,0.43,1)
+	#The tier is checked every sampleFrames frames against the rate
+	#frames can be shown at: the display's refresh rate when frames
+	#wait for it, the clock's limit if it has one, or else
+	#targetFrameRate.  Frames are timed without the wait for the
+	#display, so a frame that is held back to the refresh rate
+	#still shows how much of it was work.  The tier goes up if the
+	#median work takes more than overLimit of a frame, or if the
+	#median frame is more than missedLimit frames long, which is
+	#what work on the graphics card that doesn't fit shows up as.
+	#It goes down after downSamples checks in a row with the median
+	#work under underLimit of a frame.
+	targetFrameRate = 60.0
+	sampleFrames = 60
+	overLimit = 0.95
+	missedLimit = 1.5
+	underLimit = 0.6
+	downSamples = 3
+
+	def __init__(self,world):
+		self.world = world
+		#name: (camera, window display region, rectangle in the
+		#window as left, right, bottom, top)
+		self.insets = {"left":(world.leftCamera,world.leftDisplayRegion,(0,0.33,0,0.33)),
+					   "right":(world.rightCamera,world.rightDisplayRegion,(0.66,1,0,0.33))}
+		self.lensFar = dict([(name,camera.node().getLens().getFar()) for name, (camera, region, rect) in self.insets.items()])
+		self.buffers = {}
+		self.bufferScale = None
+		self.tier = 0
+		self.frameRate = RenderBudget.targetFrameRate
+		self.frameTimes = []
+		self.workTimes = []
+		#Real time the current frame's work started at
+		self.workStart = None
+		self.underCount = 0
+		self.frameCount = 0
+		self.task = None
+		self.flipTask = None
+		self.isEnabled = False
+
+	def toggle(self):
+		if self.isEnabled:
+			self.disable()
+		else:
+			self.enable()
+
+	def enable(self):
+		if self.isEnabled:
+			return
+		self.isEnabled = True
+		self.frameRate = self.getFrameRate()
+		self.frameTimes = []
+		self.workTimes = []
+		self.workStart = None
+		self.underCount = 0
+		#Before igLoop renders the frame
+		self.task = taskMgr.add(self.update,"renderBudget",sort=45)
+		#Before anything else in the frame
+		self.flipTask = taskMgr.add(self.flip,"renderBudgetFlip",sort=-60)
+
+	def disable(self):
+		#Back to rendering both insets straight into the window
+		if not self.isEnabled:
+			return
+		self.isEnabled = False
+		taskMgr.remove(self.task)
+		taskMgr.remove(self.flipTask)
+		self.task = None
+		self.flipTask = None
+		self.setTier(0)
+
+	def getFrameRate(self):
+		#Fastest rate frames can be shown at
+		if ConfigVariableBool("sync-video",True).getValue() and base.pipe != None:
+			info = base.pipe.getDisplayInformation()
+			index = info.getCurrentDisplayModeIndex()
+			if 0 <= index < info.getTotalDisplayModes() and info.getDisplayModeRefreshRate(index) > 0:
+				return float(info.getDisplayModeRefreshRate(index))
+		if globalClock.getMode() == ClockObject.MLimited:
+			return ConfigVariableDouble("clock-frame-rate",RenderBudget.targetFrameRate).getValue()
+		return RenderBudget.targetFrameRate
+
+	def getRegions(self):
+		#Display regions rendering each view, for the profiler
+		regions = [("left",self.world.leftDisplayRegion),
+				   ("center",base.camNode.getDisplayRegion(0)),
+				   ("right",self.world.rightDisplayRegion)]
+		for name, (buffer, region, card) in self.buffers.items():
+			regions.append((name,region))
+		return regions
+
+	def setTier(self,tier):
+		self.tier = tier
+		interval, scale, isShort = RenderBudget.tiers[tier]
+		if interval == 1 and scale == 1.0:
+			self.clearBuffers()
+		elif scale != self.bufferScale:
+			self.makeBuffers(scale)
+		for name, (camera, region, rect) in self.insets.items():
+			lens = camera.node().getLens()
+			if isShort:
+				fog = Fog("renderBudget")
+				fog.setColor(RenderBudget.hazeColor)
+				fog.setLinearRange(RenderBudget.farDistance*0.6,RenderBudget.farDistance)
+				camera.node().setInitialState(RenderState.make(FogAttrib.make(fog)))
+				camera.node().setLodScale(RenderBudget.lodScale)
+				lens.setFar(RenderBudget.farDistance)
+			else:
+				camera.node().setInitialState(RenderState.makeEmpty())
+				camera.node().setLodScale(1.0)
+				lens.setFar(self.lensFar[name])
+
+	def makeBuffers(self,scale):
+		self.clearBuffers()
+		self.bufferScale = scale
+		for name, (camera, windowRegion, rect) in self.insets.items():
+			left, right, bottom, top = rect
+			#Buffers are sized to a power of two, which the card
+			#stretches back to the inset
+			width = self.getPowerOfTwo(base.win.getXSize()*(right-left)*scale)
+			height = self.getPowerOfTwo(base.win.getYSize()*(top-bottom)*scale)
+			buffer = base.win.makeTextureBuffer("%sInset" % name,width,height)
+			buffer.setSort(-10)
+			buffer.setClearColor(RenderBudget.hazeColor)
+			region = buffer.makeDisplayRegion()
+			region.setCamera(camera)
+			#Keep the profiler's timing, if it's on
+			if windowRegion.getCullCallback() != None:
+				region.setCullCallback(windowRegion.getCullCallback())
+				region.setDrawCallback(windowRegion.getDrawCallback())
+			windowRegion.setActive(False)
+
+			#The card goes under the inset frames
+			cardMaker = CardMaker("%sInset" % name)
+			cardMaker.setFrame(left*2-1,right*2-1,bottom*2-1,top*2-1)
+			card = render2d.attachNewNode(cardMaker.generate())
+			card.setTexture(buffer.getTexture())
+			card.setBin("background",10)
+			self.buffers[name] = (buffer,region,card)
+
+	def getPowerOfTwo(self,size):
+		#Nearest power of two to size
+		return 1 << max(0,int(round(math.log(max(1.0,size),2))))
+
+	def clearBuffers(self):
+		for name, (buffer, region, card) in self.buffers.items():
+			card.removeNode()
+			base.graphicsEngine.removeWindow(buffer)
+			self.insets[name][1].setActive(True)
+		self.buffers = {}
+		self.bufferScale = None
+
+	def update(self,task):
+		interval = RenderBudget.tiers[self.tier][0]
+		for k, name in enumerate(sorted(self.buffers)):
+			self.buffers[name][0].setActive((self.frameCount+k) % interval == 0)
+		self.frameCount += 1
+
+		self.frameTimes.append(globalClock.getDt())
+		if len(self.frameTimes) < RenderBudget.sampleFrames or not self.workTimes:
+			return Task.cont
+		#The median leaves out the odd long frame, such as a level load
+		frameTime = self.getMedian(self.frameTimes)*self.frameRate
+		workTime = self.getMedian(self.workTimes)*self.frameRate
+		self.frameTimes = []
+		self.workTimes = []
+		if workTime > RenderBudget.overLimit or frameTime > RenderBudget.missedLimit:
+			self.underCount = 0
+			if self.tier < len(RenderBudget.tiers)-1:
+				self.setTier(self.tier+1)
+		elif workTime < RenderBudget.underLimit and self.tier > 0:
+			self.underCount += 1
+			if self.underCount >= RenderBudget.downSamples:
+				self.underCount = 0
+				self.setTier(self.tier-1)
+		else:
+			self.underCount = 0
+		return Task.cont
+
+	def flip(self,task):
+		#The last frame is put on the display here rather than in
+		#igLoop, so the time spent waiting for it to be shown can be
+		#left out of the frame's work
+		flipStart = globalClock.getRealTime()
+		if self.workStart != None:
+			self.workTimes.append(flipStart-self.workStart)
+		base.graphicsEngine.flipFrame()
+		self.workStart = globalClock.getRealTime()
+		return Task.cont
+
+	def getMedian(self,times):
+		times = sorted(times)
+		return times[len(times)//2]
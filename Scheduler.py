@@ -0,0 +1,92 @@
+from direct.task import Task
+
+class Scheduler:
+	#Runs the game simulation in fixed steps of stepTime seconds,
+	#independent of the render frame rate.  Every frame the elapsed
+	#time is added to an accumulator and as many whole steps as fit
+	#are run, up to maxSteps.  Time beyond that is dropped, so a slow
+	#machine runs the game slower rather than falling further behind.
+	#
+	#Each step runs the step callbacks in the order they were added.
+	#After the steps, node paths registered with addInterpolated()
+	#are drawn part way between their last two simulated positions,
+	#and the render callbacks are given the same fraction of a step
+	#to draw anything they interpolate themselves.
+	def __init__(self,stepTime=1.0/60.0,maxSteps=5):
+		self.stepTime = stepTime
+		self.maxSteps = maxSteps
+		self.accumulator = 0.0
+		self.time = 0.0
+		self.stepCallbacks = []
+		self.renderCallbacks = []
+		#Map of node path to [previous pos, previous h, sim pos, sim h]
+		self.interpolated = {}
+		self.isInterpolated = False
+		self.task = taskMgr.add(self.update,"scheduler",sort=30)
+
+	def addStep(self,callback):
+		self.stepCallbacks.append(callback)
+
+	def removeStep(self,callback):
+		if callback in self.stepCallbacks:
+			self.stepCallbacks.remove(callback)
+
+	def addRender(self,callback):
+		self.renderCallbacks.append(callback)
+
+	def removeRender(self,callback):
+		if callback in self.renderCallbacks:
+			self.renderCallbacks.remove(callback)
+
+	def addInterpolated(self,np):
+		self.interpolated[np] = [np.getPos(),np.getH(),np.getPos(),np.getH()]
+
+	def removeInterpolated(self,np):
+		self.interpolated.pop(np,None)
+
+	def update(self,task):
+		self.accumulator += globalClock.getDt()
+		#Allow for rounding when the frame time is exactly one step
+		threshold = self.stepTime*(1.0-1e-6)
+		steps = 0
+		while self.accumulator >= threshold and steps < self.maxSteps:
+			if steps == 0:
+				self.restore()
+			for np, state in self.interpolated.items():
+				state[0] = np.getPos()
+				state[1] = np.getH()
+			self.step(self.stepTime)
+			self.accumulator -= self.stepTime
+			steps += 1
+		if steps == self.maxSteps:
+			self.accumulator = 0.0
+		alpha = max(0.0,self.accumulator)/self.stepTime
+		self.interpolate(alpha)
+		for callback in self.renderCallbacks:
+			callback(alpha)
+		return Task.cont
+
+	def step(self,dt):
+		for callback in list(self.stepCallbacks):
+			callback(dt)
+		self.time += dt
+
+	def restore(self):
+		#Put interpolated node paths back on their simulated
+		#positions before the simulation moves them again.
+		if self.isInterpolated:
+			for np, state in self.interpolated.items():
+				np.setPos(state[2])
+				np.setH(state[3])
+			self.isInterpolated = False
+
+	def interpolate(self,alpha):
+		if not self.isInterpolated:
+			for np, state in self.interpolated.items():
+				state[2] = np.getPos()
+				state[3] = np.getH()
+			self.isInterpolated = True
+		for np, (prevPos, prevH, simPos, simH) in self.interpolated.items():
+			turn = (simH-prevH+180.0)%360.0-180.0
+			np.setPos(prevPos + (simPos-prevPos)*alpha)
+			np.setH(prevH + turn*alpha)
@@ -0,0 +1,122 @@
+import math
+import numpy
+from Baddie import Baddie
+from Truck import Truck
+from CascadeResolver import CascadeResolver
+
+class SpatialGrid:
+	#Tile grid index of the baddies used for proximity tests in
+	#place of collision spheres.  Each cell holds the baddies whose
+	#position falls on that tile, so trigger, hit and explosion
+	#tests only look at the baddies on nearby tiles.  Cells are
+	#dicts used as ordered sets so contacts are always handled
+	#in the same order for the same run.
+	def __init__(self,map):
+		self.map = map
+		self.store = map.world.baddieManager.store
+		self.cells = {}
+		self.baddieCells = {}
+		#Explosions and the chain reactions they set off
+		self.cascade = CascadeResolver(self)
+		self.truckX = 0
+		self.truckY = 0
+		self.truckCos = 1
+		self.truckSin = 0
+
+	def add(self,baddie):
+		self.remove(baddie)
+		self.place(baddie)
+
+	def remove(self,baddie):
+		cell = self.baddieCells.pop(baddie,None)
+		if cell != None:
+			del self.cells[cell][baddie]
+		self.store.isPlaced[baddie.index] = False
+		self.cascade.deactivate(baddie)
+
+	def place(self,baddie):
+		cell = self.map.getTile(baddie.getPos())
+		oldCell = self.baddieCells.get(baddie)
+		if cell != oldCell:
+			if oldCell != None:
+				del self.cells[oldCell][baddie]
+			self.cells.setdefault(cell,{})[baddie] = True
+			self.baddieCells[baddie] = cell
+			self.store.cell[baddie.index] = cell
+			self.cascade.move(baddie,cell)
+		self.store.isPlaced[baddie.index] = True
+
+	def activateExplosion(self,baddie):
+		self.cascade.activate(baddie)
+
+	def deactivateExplosion(self,baddie):
+		self.cascade.deactivate(baddie)
+
+	def getCells(self,x,y,radius):
+		#The tiles within radius of x,y
+		c = int(round((x-2.0)/4.0))
+		r = int(round((-1.0*(y+2.0))/4.0))
+		span = int(math.ceil(radius/4.0))
+		return [(col_index,row_index)
+				for col_index in range(c-span,c+span+1)
+				for row_index in range(r-span,r+span+1)]
+
+	def query(self,x,y,radius):
+		#All baddies on the tiles within radius of x,y
+		cells = self.cells
+		found = []
+		for key in self.getCells(x,y,radius):
+			cell = cells.get(key)
+			if cell:
+				found.extend(cell)
+		return found
+
+	def setTruck(self,truck):
+		position = truck.np.getPos()
+		h = math.radians(truck.np.getH())
+		self.truckX = position.getX()
+		self.truckY = position.getY()
+		self.truckCos = math.cos(h)
+		self.truckSin = math.sin(h)
+
+	def getTruckDistance(self,position):
+		#Distance from position to the truck's footprint,
+		#measured in the truck's own frame.
+		dx = position.getX()-self.truckX
+		dy = position.getY()-self.truckY
+		x = dx*self.truckCos + dy*self.truckSin
+		y = dy*self.truckCos - dx*self.truckSin
+		x1, x2, y1, y2 = Truck.bounds
+		outX = max(x1-x, 0, x-x2)
+		outY = max(y1-y, 0, y-y2)
+		return math.hypot(outX,outY)
+
+	def step(self,truck):
+		#Only baddies that have moved onto another tile are
+		#filed again.  Map.getTile rounds the same way.
+		store = self.store
+		n = store.count
+		pos = store.pos[:n]
+		cols = numpy.round((pos[:,0]-2.0)/4.0)
+		rows = numpy.round((-1.0*(pos[:,1]+2.0))/4.0)
+		cells = store.cell[:n]
+		moved = store.isPlaced[:n] & ((cols != cells[:,0]) | (rows != cells[:,1]))
+		baddies = store.baddies
+		for i in numpy.flatnonzero(moved).tolist():
+			self.place(baddies[i])
+		self.setTruck(truck)
+
+		#Baddies near the truck can be triggered or run over
+		reach = truck.reach + Baddie.triggerRadius
+		for baddie in self.query(self.truckX,self.truckY,reach):
+			if baddie.isEnd:
+				continue
+			distance = self.getTruckDistance(baddie.getPos())
+			if baddie.isHitArmed and distance <= Baddie.hitRadius:
+				baddie.die()
+			elif baddie.isTriggerArmed and distance <= Baddie.triggerRadius:
+				baddie.trigger(truck.np)
+
+		#Active explosions reach the truck and any
+		#baddie that can still be hit.
+		self.cascade.step(truck)
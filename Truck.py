@@ -1,43 +1,36 @@
 from direct.showbase import DirectObject
-from direct.actor.Actor import Actor
-from direct.interval.IntervalGlobal import Sequence,Parallel,Wait,Func,LerpFunc,SoundInterval
-from pandac.PandaModules import CollisionNode, CollisionSegment, CollisionPolygon, BitMask32
-from pandac.PandaModules import CollisionHandlerEvent
-from pandac.PandaModules import Point3, Vec3
-import sound
+from pandac.PandaModules import CollisionNode, CollisionSegment, BitMask32
+from Level import tileSize
+from WallCollider import WallCollider
+import assets
 
 import math
-import time
 
 class Truck(DirectObject.DirectObject):
 	adjustedHeading = {   0:270,
 						 90:180,
 						180: 90,
 						270:  0}
+	#Footprint of the truck in its own frame as x1,x2,y1,y2,
+	#and the furthest any part of it is from its origin.
+	bounds = (-5.1, 1, -1, 1)
+	reach = math.hypot(5.1, 1)
+	#Actor model paths and animations
+	actor = ("models/truck",
+			 {"forward":"models/truck-forward",
+			  "idle":"models/truck-idle"})
+	explosionActor = ("models/baddie",
+					  {"explode":"models/baddie-explode"})
 	def __init__(self,world,parent,
 				 startColumn,startRow,startHeading):
 		DirectObject.DirectObject.__init__(self)
-		self.world = world
-		self.parent = parent
 
 		#Create the truck node path		
-		self.np = Actor()
-		self.np.loadModel("models/truck")
-		self.np.loadAnims({"forward":"models/truck-forward",
-							   "idle":"models/truck-idle"})
-		self.np.reparentTo(parent)
-
-		#Load Sounds
-		self.idleSound = sound.load("sounds/truck-idle.wav")
-		self.idleSound.setLoop(True)
-		self.forwardSound = sound.load("sounds/truck-forward.wav")
-		self.forwardSound.setLoop(True)
+		self.np = assets.loadActor(*Truck.actor)
 
 		#Use baddie actor to simulat the truck exploding
 		#if/when the time comes
-		self.explosion = Actor()
-		self.explosion.loadModel("models/baddie")
-		self.explosion.loadAnims({"explode":"models/baddie-explode"})
+		self.explosion = assets.loadActor(*Truck.explosionActor)
 		self.explosion.setScale(0.33)
 
 		#Create Nodes to which cameras can be attached.
@@ -52,10 +45,9 @@ class Truck(DirectObject.DirectObject):
 
 		#Create collision solids
 		#I'll use segments that go around the truck as "from" solids
-		#and a polygon that is encompased by those same corners as
-		#an "into" solid.  From solids will be used to detect collisions
-		#with walls and the goal, while Intp solids will be used by the
-		#bad guys to detect the truck.
+		#to detect the goal.  Walls are handled by the truck's own
+		#WallCollider and the bad guys detect the truck through the
+		#map's SpatialGrid, both using bounds.
 		truckCorners = ((-5.1,  1,-5.1, -1),
 						(-5.1, -1,   1, -1),
 						(   1, -1,   1,  1),
@@ -69,22 +61,29 @@ class Truck(DirectObject.DirectObject):
 		solidFromNode.setIntoCollideMask(BitMask32(0x0))
 		self.fromNp = self.np.attachNewNode(solidFromNode)
 
-		solidIntoNode = CollisionNode("truck")
-		polyPoints = [(x,y,0.5) for x,y,j,k in truckCorners]
-		polySolid = CollisionPolygon( Point3(*polyPoints[0]),
-									  Point3(*polyPoints[1]),
-									  Point3(*polyPoints[2]),
-									  Point3(*polyPoints[3]))
-		solidIntoNode.addSolid(polySolid)
-		solidIntoNode.setFromCollideMask(BitMask32(0x0))
-		solidIntoNode.setIntoCollideMask(BitMask32(0x2))
-		self.intoNp = self.np.attachNewNode(solidIntoNode)
-
-		#Create a handler for collisions
-		self.cHandler = CollisionHandlerEvent()
-		self.cHandler.addInPattern("%fn")
-		self.accept("truck", self.collision)
-		world.cTrav.addCollider(self.fromNp, self.cHandler)
+		#The truck is moved by step(), which the world's Scheduler
+		#calls at a fixed rate while the truck is active.  Only the
+		#walls in a window of tiles around the truck are given to
+		#the collider, and the window follows the truck as it moves.
+		self.collider = WallCollider(Truck.bounds)
+		self.moveSpeed=7
+		self.rotSpeed=75
+
+		self.reuse(world,parent,startColumn,startRow,startHeading)
+
+	def reuse(self,world,parent,
+			  startColumn,startRow,startHeading):
+		#Set the truck up on a new level.  Everything made in
+		#__init__ is kept while the truck waits in the world's
+		#ObjectPool, and release() undoes everything done here.
+		self.world = world
+		self.parent = parent
+		assets.useActor(*Truck.actor)
+		assets.useActor(*Truck.explosionActor)
+		self.np.reparentTo(parent)
+		#The goal is found by the traverser, and passed to
+		#collision() by the world's CollisionDispatcher
+		world.collisions.addCollider(world.cTrav,self.fromNp,self.collision)
 
 		#Record startup info for reset to use
 		self.startInfo = (startColumn,startRow,startHeading)
@@ -101,40 +100,32 @@ class Truck(DirectObject.DirectObject):
 
 		#Variables used to determine different aspects
 		#of movement.
-		self.lastGoodPos = None
-		self.lastGoodH = None
 		self.isMoving = False
 		self.np.loop("idle")
-		self.walls = []
-		self.interval = Sequence(Func(self.updateWalls),
-								 LerpFunc(self.move,fromData=0.0,toData=1.0,duration=1) )
-		self.moveSpeed=7
-		self.rotSpeed=75
+		self.isActive = False
+		self.wallWindow = None
+		self.walls = {}
+		self.collider.setSegments([])
 		self.moveDir = 0
 		self.rotDir = 0
-		self.prevMoveT = 0
-
-		self.resetTime = 0
 
 	def reset(self):
 		startColumn, startRow, startHeading = self.startInfo
 
 		self.explosion.detachNode()
 
-		self.interval.pause()
+		self.isActive = False
 		self.np.setPos(self.world.map.getTilePos(startColumn,startRow))
-		self.lastGoodPos = self.np.getPos()
 		self.np.setH(Truck.adjustedHeading[startHeading])
-		self.lastGoodH = self.np.getH()
-		self.prevMoveT = 0
+		self.world.scheduler.addInterpolated(self.np)
 		self.resetCameras()
 		self.updateWalls()
 		
 		self.isMoving = False
 		self.np.loop("idle")
-		self.idleSound.play()
+		self.world.audio.play("sounds/truck-idle.wav")
 
-		self.interval.loop()
+		self.isActive = True
 
 	def resetCameras(self):
 		self.cameraForwardMount.setPos(8,0,4)
@@ -158,53 +149,77 @@ class Truck(DirectObject.DirectObject):
 		if keyMap["left"]:
 			self.rotDir += 1		  
 
-	def move(self,t):
-		if t < self.prevMoveT: elapse = (1.0 - self.prevMoveT) + t
-		else: elapse = t - self.prevMoveT
-		self.prevMoveT = t
-		
-		self.lastGoodPos = self.np.getPos()
-		self.lastGoodH = self.np.getH()
+	def step(self,dt):
+		if not self.isActive:
+			return
+		profiler = self.world.profiler
+		startTime = profiler.start()
+		self.updateWalls()
+		profiler.stop("truck.walls",startTime)
+		startTime = profiler.start()
+		self.move(dt)
+		profiler.stop("truck.move",startTime)
+		profiler.count("wallSegments",len(self.collider.normals))
 
+	def move(self,elapse):
 		if not self.moveDir and self.isMoving:
 			self.isMoving = False
 			self.np.loop("idle")
-			self.forwardSound.stop()
-			self.idleSound.play()
+			self.world.audio.stop("sounds/truck-forward.wav")
+			self.world.audio.play("sounds/truck-idle.wav")
 		if self.moveDir and not self.isMoving:
 			self.isMoving = True
 			self.np.loop("forward")
-			self.forwardSound.play()
-			self.idleSound.stop()
+			self.world.audio.play("sounds/truck-forward.wav")
+			self.world.audio.stop("sounds/truck-idle.wav")
 
 		if self.moveDir:
-			self.np.setH(self.np.getH()+self.rotSpeed*elapse*self.rotDir*self.moveDir)
-			forward  = self.np.getNetTransform().getMat().getRow3(0)*-1
-			forward.setZ(0)
-			forward.normalize()
-			self.np.setPos(self.np.getPos() + forward*(self.moveSpeed*elapse*self.moveDir))
+			#Turn unless that would swing the truck into a wall,
+			#then drive forward sliding along any wall in the way
+			x, y, z = self.np.getPos()
+			h = self.np.getH()+self.rotSpeed*elapse*self.rotDir*self.moveDir
+			if self.collider.isClear(x,y,h):
+				self.np.setH(h)
+			else:
+				h = self.np.getH()
+			distance = self.moveSpeed*elapse*self.moveDir
+			radians = math.radians(h)
+			x, y = self.collider.move(x,y,h,-math.cos(radians)*distance,-math.sin(radians)*distance)
+			self.np.setPos(x,y,z)
+
+		self.world.map.updateView(self.np.getPos())
 
 		#This is so the overhead camera doesn't
 		#swing around and make people sick.
 		self.cameraOverheadMount.setH(-self.np.getH()+90)
 
+	def getWallRadius(self):
+		#Tiles either side of the truck's tile whose walls the truck
+		#could touch by the end of its next step, at its current speed.
+		stepDistance = self.moveSpeed*abs(self.moveDir)*self.world.scheduler.stepTime
+		return int(math.ceil((Truck.reach+stepDistance)/tileSize))+1
+
 	def updateWalls(self):
-		walls = self.walls
-		[wall.setCollideMask(BitMask32(0x0)) for wall in walls]
+		#Nothing changes until the truck changes tile or speed.
+		#Then only the tiles leaving and entering the window change.
 		c, r = self.world.map.getTile(self.np.getPos())
-		walls = self.world.map.getWalls(c-3,c+3,r-3,r+3)
-		[wall.setIntoCollideMask(BitMask32(0x1)) for wall in walls]
-		self.walls = walls
+		radius = self.getWallRadius()
+		window = (c-radius,c+radius,r-radius,r+radius)
+		if window != self.wallWindow:
+			map = self.world.map
+			walls = self.walls
+			if self.wallWindow != None:
+				for tile, segments in map.getWindowWalls(self.wallWindow,window):
+					del walls[tile]
+			for tile, segments in map.getWindowWalls(window,self.wallWindow):
+				walls[tile] = segments
+			self.collider.setSegments([segment for segments in walls.values() for segment in segments])
+			self.wallWindow = window
 
 	def collision(self,entry):
 		if entry.getIntoNode().getName() == "goal":
 			self.setEnd()
 			self.world.setWinner()
-		else:
-			self.interval.pause()
-			self.np.setPos(self.lastGoodPos)
-			self.np.setH(self.lastGoodH)
-			self.interval.resume()
 
 	def explode(self):
 		self.explosion.reparentTo(self.np)
@@ -216,8 +231,20 @@ class Truck(DirectObject.DirectObject):
 		self.setEnd()
 
 	def setEnd(self):
-		self.interval.pause()
+		self.isActive = False
 		self.np.stop()
-		self.forwardSound.stop()
-		self.idleSound.stop()
+		self.world.audio.stop("sounds/truck-forward.wav")
+		self.world.audio.stop("sounds/truck-idle.wav")
+
+	def release(self):
+		#Leave the level: stop, let go of every event and the
+		#level's traverser and scheduler, and come off the map.
+		self.setEnd()
+		self.ignoreAll()
+		self.world.collisions.removeCollider(self.world.cTrav,self.fromNp)
+		self.world.scheduler.removeInterpolated(self.np)
+		self.explosion.stop()
+		self.explosion.detachNode()
+		self.np.detachNode()
+		self.parent = None
 
@@ -0,0 +1,131 @@
+import math
+import numpy
+
+class WallCollider:
+	#Moves a box through the level's walls without the collision
+	#traverser.  Every wall is a vertical segment along one of the
+	#tile grid lines, so seen from above the problem is a rotated
+	#rectangle sliding past line segments, which has a closed form.
+	#
+	#For each segment the box and the segment are projected onto
+	#the box's two axes and the segment's normal.  On each axis the
+	#box's projection overlaps the segment's for one span of the
+	#move, and the box first touches the segment at the latest start
+	#of those spans.  The box moves up to the first segment it
+	#touches, then the rest of the move slides along that segment.
+	#
+	#The box is grown by skin while sweeping, so it comes to rest
+	#just short of a wall rather than exactly on it.
+	skin = 0.01
+	maxSlides = 3
+
+	def __init__(self,bounds):
+		#bounds are x1,x2,y1,y2 in the box's own frame
+		x1, x2, y1, y2 = bounds
+		self.center = ((x1+x2)/2.0,(y1+y2)/2.0)
+		self.extents = ((x2-x1)/2.0,(y2-y1)/2.0)
+		self.setSegments([])
+
+	def setSegments(self,segments):
+		#segments are x1,y1,x2,y2 in world units
+		segments = numpy.array(segments,numpy.float64).reshape(-1,4)
+		self.starts = segments[:,0:2]
+		self.ends = segments[:,2:4]
+		direction = self.ends-self.starts
+		length = numpy.hypot(direction[:,0],direction[:,1])
+		length[length == 0] = 1.0
+		self.normals = numpy.stack([-direction[:,1]/length,direction[:,0]/length],axis=1)
+
+	def getAxes(self,h):
+		#Box center axis offsets for heading h, and the
+		#three axes to test against every segment
+		radians = math.radians(h)
+		c = math.cos(radians)
+		s = math.sin(radians)
+		count = len(self.normals)
+		axes = numpy.empty((count,3,2))
+		axes[:,0] = (c,s)
+		axes[:,1] = (-s,c)
+		axes[:,2] = self.normals
+		cx, cy = self.center
+		return (cx*c-cy*s,cx*s+cy*c), (c,s), (-s,c), axes
+
+	def project(self,x,y,h,grow):
+		#Projections of the box and segments onto every axis:
+		#box center, box radius, segment min and segment max
+		offset, u, w, axes = self.getAxes(h)
+		ex, ey = self.extents
+		center = numpy.array([x+offset[0],y+offset[1]])
+		boxCenter = axes.dot(center)
+		boxRadius = ex*numpy.abs(axes.dot(u))+ey*numpy.abs(axes.dot(w))+grow
+		startProj = numpy.einsum("nad,nd->na",axes,self.starts)
+		endProj = numpy.einsum("nad,nd->na",axes,self.ends)
+		return axes, boxCenter, boxRadius, numpy.minimum(startProj,endProj), numpy.maximum(startProj,endProj)
+
+	def isClear(self,x,y,h):
+		#True if the box at x,y facing h overlaps no segment
+		if not len(self.normals):
+			return True
+		axes, boxCenter, boxRadius, segMin, segMax = self.project(x,y,h,0.0)
+		overlaps = (boxCenter-boxRadius < segMax) & (boxCenter+boxRadius > segMin)
+		return not overlaps.all(axis=1).any()
+
+	def sweep(self,x,y,h,dx,dy):
+		#Fraction of the move dx,dy the box can make before touching
+		#a segment, and the normal of that segment pointing back at
+		#the box, or (1.0,None) if it touches nothing.
+		if not len(self.normals):
+			return 1.0, None
+		axes, boxCenter, boxRadius, segMin, segMax = self.project(x,y,h,WallCollider.skin)
+		speed = axes.dot((dx,dy))
+		isStill = speed == 0.0
+		speed = numpy.where(isStill,1.0,speed)
+		timeA = (segMin-boxRadius-boxCenter)/speed
+		timeB = (segMax+boxRadius-boxCenter)/speed
+		enter = numpy.minimum(timeA,timeB)
+		leave = numpy.maximum(timeA,timeB)
+		#An axis the box doesn't move along either always
+		#overlaps or never does
+		overlaps = (boxCenter-boxRadius < segMax) & (boxCenter+boxRadius > segMin)
+		enter = numpy.where(isStill,numpy.where(overlaps,-numpy.inf,numpy.inf),enter)
+		leave = numpy.where(isStill,numpy.where(overlaps,numpy.inf,-numpy.inf),leave)
+		touch = enter.max(axis=1)
+		part = leave.min(axis=1)
+		isHit = (touch < part) & (touch < 1.0) & (part > 0.0)
+
+		#The contact normal is the axis the box reached last,
+		#turned to point from the segment to the box
+		contactAxis = enter.argmax(axis=1)
+		rows = numpy.arange(len(axes))
+		normals = axes[rows,contactAxis]
+		segCenter = (segMin[rows,contactAxis]+segMax[rows,contactAxis])/2.0
+		sign = numpy.where(boxCenter[rows,contactAxis] >= segCenter,1.0,-1.0)
+		normals = normals*sign[:,None]
+		#A box already touching a segment may still
+		#move away from it or along it
+		isHit &= (touch > 0.0) | (normals.dot((dx,dy)) < 0.0)
+		if not isHit.any():
+			return 1.0, None
+		touch = numpy.where(isHit,touch,numpy.inf)
+		first = int(touch.argmin())
+		return max(0.0,float(touch[first])), normals[first]
+
+	def move(self,x,y,h,dx,dy):
+		#Where the box ends up after trying to move by dx,dy,
+		#sliding along any wall it runs into.
+		for slide in range(WallCollider.maxSlides):
+			if dx == 0.0 and dy == 0.0:
+				break
+			fraction, normal = self.sweep(x,y,h,dx,dy)
+			x += dx*fraction
+			y += dy*fraction
+			if normal is None:
+				break
+			#Keep the part of the rest of the move along the wall
+			dx *= 1.0-fraction
+			dy *= 1.0-fraction
+			into = dx*normal[0]+dy*normal[1]
+			if into < 0.0:
+				dx -= into*normal[0]
+				dy -= into*normal[1]
+		return x, y
@@ -0,0 +1,368 @@
+from direct.showbase import DirectObject
+from direct.interval.IntervalGlobal import Sequence, Func, Wait
+from direct.gui.OnscreenImage import OnscreenImage
+from direct.gui.OnscreenText import OnscreenText
+from panda3d.core import Point3, Vec3, Camera, CollisionTraverser, TransparencyAttrib
+import sys
+import os
+from Map import Map
+from Scheduler import Scheduler
+from BaddieManager import BaddieManager
+from LevelPreloader import LevelPreloader
+from ObjectPool import ObjectPool
+from Profiler import Profiler
+from RenderBudget import RenderBudget
+from CollisionDispatcher import CollisionDispatcher
+from AudioManager import AudioManager
+import assets
+
+class World(DirectObject.DirectObject):
+	#Symbol tables used to decode map files.
+	#Format: symbol: [model path, heading, collision mask]
+
+	
+	def __init__(self,mapName=None,headless=False):
+		base.disableMouse()		
+		self.level = 0
+		#Headless worlds run the game logic with no window,
+		#so there are no cameras, display regions or images.
+		self.headless = headless
+		self.outcome = None
+
+		self.accept("q",self.quit)
+
+		#Frame timing overlay, toggled with p
+		self.profiler = Profiler(self)
+		self.accept("p",self.profiler.toggle)
+
+		#The simulation runs in fixed steps through the scheduler
+		#rather than once per rendered frame.
+		self.scheduler = Scheduler()
+		self.baddieManager = BaddieManager(self)
+		self.scheduler.addStep(self.baddieManager.step)
+		self.scheduler.addStep(self.step)
+		self.scheduler.addRender(self.baddieManager.store.sync)
+
+		#Items used during game play
+		self.cTrav = None
+		self.collisions = CollisionDispatcher()
+		self.truck = None
+		self.baddies = []
+		self.mapNp = None
+		self.map = Map(self)
+		#Trucks and baddies are kept from level to level
+		self.pool = ObjectPool()
+		self.isWaitForInput = False
+		#The next level is loaded in the background
+		#while the winner screen is up.
+		self.preloader = LevelPreloader(self)
+
+		self.splashImage = None
+		self.splashText = None
+		#Sounds are played on a fixed set of voices
+		self.audio = AudioManager(self)
+
+		#cameraMounts is empty now, but when
+		#a map is loaded this will be filled with,
+		#in order, the forward view, overhead view, and rear view
+		#camera mounts on the truck.  The camera order
+		#in cameraPositions will then determine which
+		#mount which camera is mounted to.
+		self.cameraMounts = []
+		self.cameraPositions = []
+		self.leftFrame = None
+		self.rightFrame = None
+		if not headless:
+			self.setupCameras()
+
+		if mapName == None:
+			self.showOpening()
+		else:
+			self.loadLevel(mapName)
+
+	def setupCameras(self):
+		self.centerCamera = base.camera
+		self.leftCamera = render.attachNewNode(Camera("camera"))
+		self.leftCamera.node().setScene(render)
+		self.rightCamera = render.attachNewNode(Camera("camera"))
+		self.rightCamera.node().setScene(render)
+
+		self.leftDisplayRegion = base.win.makeDisplayRegion(0,0.33,0,0.33)
+		self.leftDisplayRegion.setClearColorActive(1)
+		self.leftDisplayRegion.setClearDepthActive(1)
+		self.leftDisplayRegion.setCamera(self.leftCamera)
+		
+		self.rightDisplayRegion = base.win.makeDisplayRegion(0.66,1,0,0.33)
+		self.rightDisplayRegion.setClearColorActive(1)
+		self.rightDisplayRegion.setClearDepthActive(1)
+		self.rightDisplayRegion.setCamera(self.rightCamera)
+
+		self.cameraPositions = [self.leftCamera, self.centerCamera, self.rightCamera]
+
+		#The insets are rendered more cheaply when frames run
+		#long, unless turned off with b
+		self.renderBudget = RenderBudget(self)
+		self.renderBudget.enable()
+		self.accept("b",self.renderBudget.toggle)
+
+	def showOpening(self,index=0):
+		if index == 3:
+			self.acceptOnce("space",self.loadNextLevel)
+			self.loadNextLevel()
+		else:
+			self.showImage("images/opening%d.png" % index)
+			self.acceptOnce("space",self.showOpening,[index+1])
+
+	def loadLevel(self,mapName):
+		#Level numbers continue on to the following levels,
+		#while named maps are loaded on their own.
+		try:
+			self.level = int(mapName)-1
+		except ValueError:
+			self.loadNextLevel(mapName)
+		else:
+			self.loadNextLevel()
+
+	def loadNextLevel(self,mapName=None):
+		self.ignore("c")
+		self.ignore("space")
+		self.isWaitForInput = False
+		self.outcome = None
+		self.clearImage()
+		self.clearText()
+		
+		#Now load the next map.
+		if mapName == None:
+			self.level += 1
+			mapPath = self.getLevelPath(self.level)
+		else:
+			mapPath = "levels/%s.txt" % str(mapName)
+			
+		if self.mapNp != None:
+			#Stop anything still moving or listening for events
+			#on the old map and put it back in the pool for the
+			#next map before the old map is detached.
+			self.pool.release(self.truck)
+			[self.pool.release(baddie) for baddie in self.baddies]
+			self.truck = None
+			self.baddies = []
+			self.baddieManager.clear()
+			self.mapNp.detachNode()
+		if not os.path.exists(mapPath):
+			self.clearFrames()
+			self.showGameOver()
+		else:
+			self.cTrav = CollisionTraverser()
+			self.collisions.clear()
+			#self.cTrav.showCollisions(render)
+			map = self.preloader.take(mapPath)
+			if map != None:
+				#Built in the background, it only needs
+				#its truck and baddies
+				self.map = map
+				self.mapNp = map.head
+				self.mapNp.reparentTo(render)
+				self.truck, self.baddies = self.map.populate()
+			else:
+				self.mapNp = render.attachNewNode("Map Level %d" % self.level)
+				assets.beginLevel()
+				self.map = Map(self)
+				self.truck, self.baddies = self.map.load(self.mapNp,mapPath)
+			assets.evictUnused()
+			self.audio.evictUnused()
+			self.truck.reset()
+			[baddie.reset() for baddie in self.baddies]
+			
+			self.cameraMounts = [(self.truck.cameraForwardMount,self.truck.cameraForwardTarget),
+								(self.truck.cameraOverheadMount,self.truck.cameraOverheadTarget),
+								(self.truck.cameraRearMount,self.truck.cameraRearTarget)]
+			self.resetCameras()
+
+			self.audio.stop("sounds/winner.wav")
+			self.showFrames()
+			self.showText(self.map.getName())
+			self.accept("c",self.rotateCameras)
+
+	def getLevelPath(self,level):
+		return "levels/%d.txt" % int(level)
+
+	def step(self,dt):
+		if self.truck == None:
+			return
+		profiler = self.profiler
+		profiler.count("steps")
+		self.truck.step(dt)
+
+		#Collisions are handled straight away
+		#so the rest of the step sees their effect.
+		startTime = profiler.start()
+		self.cTrav.traverse(render)
+		profiler.count("collisions",self.collisions.dispatch())
+		profiler.stop("traverse",startTime)
+
+		#Baddie to truck and baddie to baddie contacts are found
+		#through the map's grid rather than the collision traverser.
+		if self.truck != None and self.map.grid != None:
+			startTime = profiler.start()
+			self.map.grid.step(self.truck)
+			profiler.stop("grid",startTime)
+
+	def resetLevel(self):
+		self.ignore("space")
+		self.isWaitForInput = False
+		self.outcome = None
+		self.truck.reset()
+		for baddie in self.baddies:
+			baddie.reset()
+		self.resetCameras()
+		self.clearImage()
+		self.showText(self.map.getName())
+		self.audio.stop("sounds/loser.wav")
+		self.accept("c",self.rotateCameras)
+
+	def showText(self,text):
+		self.clearText()
+		if self.headless:
+			return
+		self.splashText = OnscreenText(text,
+									pos=(0,-0.90,0),
+									fg=(255,255,1,1))
+
+	def clearText(self):
+		if self.splashText != None:
+			self.splashText.destroy()
+			self.splashText = None
+
+	def showImage(self,path):
+		self.clearImage()
+		if self.headless:
+			return
+		self.splashImage = OnscreenImage(path,
+										 parent=render2d)
+		self.splashImage.setTransparency(TransparencyAttrib.MAlpha)
+
+	def clearImage(self):
+		if self.splashImage != None:
+			self.splashImage.destroy()
+			self.splashImage = None		
+
+	def showFrames(self):
+		if self.headless:
+			return
+		if self.leftFrame == None:
+			self.leftFrame = OnscreenImage("images/leftframe.png",
+										pos = (-0.67,0,-0.67),
+										scale=0.35,
+										parent=render2d)
+			self.leftFrame.setTransparency(TransparencyAttrib.MAlpha)
+		if self.rightFrame == None:
+			self.rightFrame = OnscreenImage("images/rightframe.png",
+											pos = (0.65,0,-0.67),
+											scale=0.35,
+											parent=render2d)
+			self.rightFrame.setTransparency(TransparencyAttrib.MAlpha)
+
+	def clearFrames(self):
+		if self.leftFrame != None:
+			self.leftFrame.destroy()
+			self.leftFrame = None
+		if self.rightFrame != None:
+			self.rightFrame.destroy()
+			self.rightFrame = None
+		
+	def resetCameras(self):
+		for cam, (mount, target) in zip(self.cameraPositions,self.cameraMounts):
+			cam.reparentTo(mount)
+			cam.lookAt(target)
+
+	def rotateCameras(self):
+		self.cameraPositions = self.cameraPositions[1:] + self.cameraPositions[:1]
+		self.resetCameras()
+		
+	def quit(self):
+		sys.exit(0)
+
+	def setLoser(self):
+		if not self.isWaitForInput:
+			self.outcome = "lose"
+			self.truck.explode()
+			[baddie.setEnd() for baddie in self.baddies]
+			self.audio.play("sounds/loser.wav")
+			self.clearText()
+			self.showImage("images/loser.png")
+			self.ignore("c")
+			self.acceptOnce("space",self.resetLevel)
+			self.isWaitForInput = True
+
+	def setWinner(self):
+		if not self.isWaitForInput:
+			self.outcome = "win"
+			[baddie.setEnd(force=True) for baddie in self.baddies]
+			self.clearText()
+			self.showImage("images/winner.png")
+			self.audio.play("sounds/winner.wav")
+			for baddie in self.baddies:
+				baddie.setEnd()
+			self.acceptOnce("space",self.loadNextLevel)
+			self.isWaitForInput = True
+			nextPath = self.getLevelPath(self.level+1)
+			if not self.headless and os.path.exists(nextPath):
+				self.preloader.start(nextPath,"Map Level %d" % (self.level+1))
+
+	def showGameOver(self):
+		self.outcome = "gameover"
+		if self.headless:
+			return
+		self.renderBudget.disable()
+		self.leftDisplayRegion.setClearColorActive(0)
+		self.leftDisplayRegion.setClearDepthActive(0)		
+		self.rightDisplayRegion.setClearColorActive(0)
+		self.rightDisplayRegion.setClearDepthActive(0)
+		
+		assets.clear()
+		backDrop = assets.loadModel("models/backdrop")
+		backDrop.setScale(20)
+		backDrop.reparentTo(render)
+		backDrop.setHpr(Vec3(0,90,0))
+		backDrop.setPos(Point3(0,10,0))
+		
+		actor = assets.loadActor("models/baddie",
+								 {"walk":"models/baddie-walk",
+								  "explode":"models/baddie-explode"})
+		actor.setScale(0.4)
+		actor.reparentTo(render)
+		actor.setPos(Point3(6,0,0))
+		actor.setHpr(Vec3(270,0,0))
+
+		self.clearText()
+		self.showImage("images/gameover.png")
+
+		self.centerCamera.reparentTo(render)
+		self.centerCamera.setPos(Point3(-5,-10,3))
+		self.centerCamera.lookAt(Point3(0,0,0))
+
+		def walk():
+			self.audio.play("sounds/winner.wav")
+			actor.setScale(0.4)
+			actor.loop("walk")
+		def cheer():
+			actor.play("explode",fromFrame=0,toFrame=19)
+		def explode1():
+			self.audio.play("sounds/loser.wav")
+			actor.play("explode",fromFrame=19,toFrame=23)
+		def explode2():
+			actor.setScale(0.25)
+			actor.play("explode",fromFrame=24)
+		def hprReset():
+			actor.setH(90)
+			  
+		interval = Sequence(Func(walk),
+							actor.posInterval(4,Point3(-2,0,0)),
+							Func(cheer),
+							Wait(19.0/24.0),
+							actor.hprInterval(2,Vec3(990,0,0)),
+							Func(explode1),
+							Wait(5.0/24.0),
+							Func(explode2),
+							Wait(2.0))
+		interval.loop()
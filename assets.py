@@ -0,0 +1,136 @@
+import json
+import os
+from direct.actor.Actor import Actor
+from pandac.PandaModules import NodePath
+
+#Loaded models and actors are kept here as templates and
+#handed out as copies.  Copies share the template's geometry
+#and animation bundles but get their own transforms and
+#animation controls.
+models = {}
+actors = {}
+#Keys of the templates that have been used since beginLevel()
+used = set()
+#Models baked by bake.py, from the manifest it writes, and the
+#file loaded for each model path asked for so far
+manifestPath = "models/bake.json"
+manifest = None
+modelFiles = {}
+
+def loadManifest():
+	if not os.path.exists(manifestPath):
+		return {}
+	fp = open(manifestPath,"r")
+	try:
+		bakes = json.load(fp)
+	except ValueError:
+		bakes = {}
+	fp.close()
+	return bakes
+
+def isBaked(path,bakes):
+	#Whether the model at path (without its extension) has a
+	#baked .bam that is up to date with all of its sources
+	sources = bakes.get(path)
+	if sources == None or not os.path.exists(path+".bam"):
+		return False
+	for sourcePath, mtime, size in sources:
+		try:
+			stat = os.stat(sourcePath)
+		except OSError:
+			return False
+		if stat.st_mtime != mtime or stat.st_size != size:
+			return False
+		#Textures are baked to .txo files next to their images
+		if sourcePath != path+".egg" and not os.path.exists(os.path.splitext(sourcePath)[0]+".txo"):
+			return False
+	return True
+
+def getFile(path):
+	#The baked .bam of the model at path, or its .egg if
+	#it hasn't been baked since the egg last changed
+	global manifest
+	file = modelFiles.get(path)
+	if file == None:
+		if manifest == None:
+			manifest = loadManifest()
+		if isBaked(path,manifest):
+			file = path+".bam"
+		else:
+			file = path+".egg"
+		modelFiles[path] = file
+	return file
+
+def getActorFiles(path,anims):
+	return getFile(path), dict([(name,getFile(animPath)) for name, animPath in anims.items()])
+
+def loadModel(path):
+	template = models.get(path)
+	if template == None:
+		template = loader.loadModel(getFile(path))
+		models[path] = template
+	used.add(path)
+	return template.copyTo(NodePath())
+
+def loadActor(path,anims={}):
+	key = (path,tuple(sorted(anims.items())))
+	template = actors.get(key)
+	if template == None:
+		template = Actor(*getActorFiles(path,anims))
+		actors[key] = template
+	used.add(key)
+	return Actor(other=template)
+
+def useActor(path,anims={}):
+	#Count an actor as used without copying it, for an
+	#existing copy that is being kept for the new level
+	key = (path,tuple(sorted(anims.items())))
+	if key in actors:
+		used.add(key)
+
+def preload(paths,actorSpecs,callback,extraArgs=[]):
+	#Load the templates for the model paths and (actor path, anims)
+	#pairs that aren't already loaded on Panda3D's asynchronous
+	#loader, then call callback().  Actor templates are made once
+	#their files are in the model pool, which doesn't take long.
+	paths = [path for path in paths if path not in models]
+	actorSpecs = [(path,anims) for path, anims in actorSpecs
+				  if (path,tuple(sorted(anims.items()))) not in actors]
+	files = [getFile(path) for path in paths]
+	for path, anims in actorSpecs:
+		files.append(getFile(path))
+		files.extend([getFile(animPath) for animPath in anims.values()])
+	if not files:
+		callback(*extraArgs)
+		return
+
+	def loaded(nodes):
+		for path, node in zip(paths,nodes):
+			#It may have been loaded in the meantime
+			if path not in models:
+				models[path] = node
+		for path, anims in actorSpecs:
+			key = (path,tuple(sorted(anims.items())))
+			if key not in actors:
+				actors[key] = Actor(*getActorFiles(path,anims))
+		callback(*extraArgs)
+	loader.loadModel(files,callback=loaded)
+
+def beginLevel():
+	used.clear()
+
+def evictUnused():
+	#Release every template that was not asked for since
+	#the last call to beginLevel()
+	for path in [path for path in models if path not in used]:
+		models.pop(path).removeNode()
+		loader.unloadModel(getFile(path))
+	for key in [key for key in actors if key not in used]:
+		actors.pop(key).cleanup()
+		path, anims = key
+		loader.unloadModel(getFile(path))
+		[loader.unloadModel(getFile(animPath)) for name, animPath in anims]
+
+def clear():
+	used.clear()
+	evictUnused()
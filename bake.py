@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+#Offline bake of the models.
+#
+#Every models/*.egg is converted to a binary models/*.bam, which loads
+#many times faster than the egg can be parsed.  The textures the eggs
+#use are written as Panda3D texture objects (.txo) next to their
+#images, with their mipmaps made and compressed ahead of time, and the
+#baked models refer to the .txo files instead of the images.
+#
+#models/bake.json records the size and modification time of every
+#source file each baked model was made from.  assets.py only loads a
+#baked model while its sources all still match, and loads the egg
+#otherwise, so a model that hasn't been baked or has been changed
+#since still loads, just more slowly.  Without --force, only models
+#whose bake is missing or out of date are baked.
+#
+#Usage: bake.py [--force] [MODEL...]
+import argparse
+import glob
+import json
+import os
+import sys
+from pandac.PandaModules import Filename, NodePath, SamplerState, Texture
+from panda3d.egg import loadEggFile
+import assets
+
+def getSourceInfo(path):
+	#What the manifest records of a source file
+	stat = os.stat(path)
+	return [path,stat.st_mtime,stat.st_size]
+
+def saveManifest(manifest):
+	#Written to a temporary file first so a partial
+	#manifest is never read by the game
+	tmpPath = assets.manifestPath+".tmp"
+	fp = open(tmpPath,"w")
+	json.dump(manifest,fp,indent=1,sort_keys=True)
+	fp.close()
+	os.replace(tmpPath,assets.manifestPath)
+
+def bakeTexture(texture,isWritten):
+	#Point texture at a .txo next to its image, writing the .txo
+	#unless isWritten.  Returns the path of the image.
+	imagePath = os.path.relpath(texture.getFullpath().toOsSpecific())
+	txoPath = os.path.splitext(imagePath)[0]+".txo"
+	if not isWritten:
+		if texture.getMinfilter() == SamplerState.FT_default:
+			texture.setMinfilter(SamplerState.FT_linear_mipmap_linear)
+		texture.generateRamMipmapImages()
+		if texture.getNumComponents() in (2,4):
+			compression = Texture.CM_dxt5
+		else:
+			compression = Texture.CM_dxt1
+		#Images too small to compress are kept as they are
+		texture.compressRamImage(compression,Texture.QL_best,None)
+		texture.write(Filename.fromOsSpecific(txoPath))
+	txoFilename = Filename.fromOsSpecific(txoPath)
+	texture.setFilename(txoFilename)
+	texture.setFullpath(txoFilename)
+	return imagePath
+
+def bakeModel(model,texturesWritten):
+	#Bake model, returning the source files it was made from
+	eggPath = model+".egg"
+	node = loadEggFile(Filename.fromOsSpecific(os.path.abspath(eggPath)))
+	if node == None:
+		raise IOError("Could not load %s" % eggPath)
+	np = NodePath(node)
+	sources = [getSourceInfo(eggPath)]
+	for texture in np.findAllTextures():
+		imagePath = bakeTexture(texture,texture.getFullpath() in texturesWritten)
+		texturesWritten.add(texture.getFullpath())
+		sources.append(getSourceInfo(imagePath))
+	if not np.writeBamFile(Filename.fromOsSpecific(model+".bam")):
+		raise IOError("Could not write %s.bam" % model)
+	return sources
+
+def main():
+	parser = argparse.ArgumentParser(description="Bake the egg models into bam files with compressed textures.")
+	parser.add_argument("models",nargs="*",help="models to bake, such as models/truck, all of models/ by default")
+	parser.add_argument("--force",action="store_true",help="bake models that are already up to date")
+	args = parser.parse_args()
+
+	models = [os.path.splitext(path)[0] for path in args.models]
+	if not models:
+		models = sorted([os.path.splitext(path)[0] for path in glob.glob("models/*.egg")])
+	manifest = assets.loadManifest()
+	#Models sharing a texture only write it once.  Textures are
+	#always rewritten with the first model that uses them, so a
+	#changed image is picked up by every model baked after it.
+	texturesWritten = set()
+	for model in models:
+		if not args.force and assets.isBaked(model,manifest):
+			print("%s.bam is up to date" % model)
+			continue
+		manifest[model] = bakeModel(model,texturesWritten)
+		print("%s.egg -> %s.bam" % (model,model))
+	saveManifest(manifest)
+	return 0
+
+if __name__ == "__main__":
+	sys.exit(main())
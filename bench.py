@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+#Benchmark of the shipped levels.
+#
+#Every level in levels/ is loaded and played headless by simulate.py's
+#Simulation, each run in a process of its own so that load times and
+#peak memory don't depend on the levels run before it.  The truck is
+#driven by the same seeded random input script every time and the
+#clock moves in fixed steps, so a level plays out the same way on
+#every run.  Each level is run --repeat times and the median of each
+#number is kept.
+#
+#The numbers are compared with a baseline saved by an earlier run
+#with --save.  A number more than --tolerance percent (and more than
+#a small absolute margin) worse than the baseline is reported as a
+#regression, and the exit status is 1 if there are any.
+#
+#Usage: bench.py [--repeat N] [--time SECONDS] [--seed N]
+#                [--baseline FILE] [--save] [--tolerance PERCENT] [LEVEL...]
+import argparse
+import json
+import os
+import subprocess
+import sys
+from simulate import getLevels
+
+#Numbers compared with the baseline, with the smallest
+#change in each that counts as a regression
+metrics = (("loadMs",5.0),
+		   ("parseMs",2.0),
+		   ("modelsMs",5.0),
+		   ("collisionMs",2.0),
+		   ("populateMs",5.0),
+		   ("peakMemoryMb",2.0),
+		   ("frameP50Ms",0.1),
+		   ("frameP95Ms",0.25),
+		   ("frameP99Ms",0.5))
+#Results that must match the baseline exactly or the
+#levels no longer play out the same way
+outcomes = ("outcome","frames","baddies","kills")
+
+def runLevel(mapName,seed,maxTime):
+	#Run in the child process
+	import resource
+	import simulate
+	simulation = simulate.Simulation()
+	result = simulation.run(mapName,simulate.InputScript.random(seed,maxTime),maxTime)
+	peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+	#Kilobytes on Linux, bytes on Mac OS
+	if sys.platform == "darwin":
+		peak /= 1024.0
+	result["peakMemoryMb"] = peak/1024.0
+	return result
+
+def measure(mapName,args):
+	runs = []
+	for i in range(args.repeat):
+		output = subprocess.check_output([sys.executable,__file__,"--child",
+										  "--seed",str(args.seed),
+										  "--time",str(args.time),
+										  mapName],
+										 stderr=subprocess.DEVNULL)
+		runs.append(json.loads(output.decode().strip().splitlines()[-1]))
+	result = runs[0]
+	for name, margin in metrics:
+		values = sorted([run[name] for run in runs])
+		result[name] = values[len(values)//2]
+	return result
+
+def compare(result,baseline,tolerance):
+	#Report lines for one level and whether it regressed
+	lines = []
+	isRegressed = False
+	for name in outcomes:
+		if baseline != None and result[name] != baseline.get(name):
+			lines.append("  %-14s %10s  baseline %10s  CHANGED" % (name,result[name],baseline.get(name)))
+	for name, margin in metrics:
+		value = result[name]
+		if baseline == None or name not in baseline:
+			lines.append("  %-14s %10.2f" % (name,value))
+			continue
+		base = baseline[name]
+		change = value-base
+		percent = 100.0*change/base if base else 0.0
+		flag = ""
+		if change > margin and change > base*tolerance/100.0:
+			flag = "  REGRESSION"
+			isRegressed = True
+		elif -change > margin and -change > base*tolerance/100.0:
+			flag = "  improved"
+		lines.append("  %-14s %10.2f  baseline %10.2f  %+7.1f%%%s" % (name,value,base,percent,flag))
+	return lines, isRegressed
+
+def main():
+	parser = argparse.ArgumentParser(description="Benchmark the levels against a saved baseline.")
+	parser.add_argument("levels",nargs="*",help="level numbers or names, all of levels/ by default")
+	parser.add_argument("--repeat",type=int,default=3,help="runs of each level, the median is kept")
+	parser.add_argument("--time",type=float,default=60.0,help="simulated seconds to play each level")
+	parser.add_argument("--seed",type=int,default=1,help="seed of the random input script")
+	parser.add_argument("--baseline",default="bench_baseline.json",help="baseline file")
+	parser.add_argument("--save",action="store_true",help="save the results as the new baseline")
+	parser.add_argument("--tolerance",type=float,default=10.0,help="percent worse than the baseline allowed")
+	parser.add_argument("--child",action="store_true",help=argparse.SUPPRESS)
+	args = parser.parse_args()
+
+	if args.child:
+		print(json.dumps(runLevel(args.levels[0],args.seed,args.time)))
+		return 0
+
+	baselines = {}
+	if os.path.exists(args.baseline):
+		fp = open(args.baseline,"r")
+		baselines = json.load(fp)
+		fp.close()
+
+	results = {}
+	isRegressed = False
+	for mapName in args.levels or getLevels():
+		result = measure(mapName,args)
+		results[mapName] = result
+		lines, isLevelRegressed = compare(result,baselines.get(mapName),args.tolerance)
+		isRegressed = isRegressed or isLevelRegressed
+		print("%s: %s, %d baddies, %s" % (mapName,result["name"],result["baddies"],result["outcome"]))
+		print("\n".join(lines))
+		sys.stdout.flush()
+
+	if args.save:
+		baselines.update(results)
+		fp = open(args.baseline,"w")
+		json.dump(baselines,fp,indent=1,sort_keys=True)
+		fp.close()
+		print("Saved baseline to %s" % args.baseline)
+	return 1 if isRegressed and not args.save else 0
+
+if __name__ == "__main__":
+	sys.exit(main())
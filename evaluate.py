@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+#Batch evaluation of levels across a pool of worker processes.
+#
+#Every combination of level and input (script file or random seed)
+#is played through headless by simulate.py.  Each worker process
+#runs its own Panda3D instance and plays its share of the runs one
+#after the other.  The results are written as JSON or CSV.
+#
+#Usage: evaluate.py [--levels LEVEL...] [--scripts FILE...] [--seeds N...]
+#                   [--workers N] [--format json|csv] [--output FILE]
+import argparse
+import csv
+import json
+import multiprocessing
+import sys
+from simulate import getLevels
+
+fields = ["level","name","input","outcome","time","timeToGoal","frames",
+		  "baddies","kills","loadMs","parseMs","modelsMs","collisionMs","populateMs",
+		  "frameMeanMs","frameP50Ms","frameP95Ms","frameP99Ms","frameMaxMs"]
+
+#Each worker process keeps one Simulation for all of its runs
+simulation = None
+
+def startWorker(step):
+	global simulation
+	import simulate
+	simulation = simulate.Simulation(step)
+
+def runJob(job):
+	import simulate
+	mapName, scriptPath, seed, maxTime = job
+	if scriptPath != None:
+		script = simulate.InputScript.load(scriptPath)
+		inputName = scriptPath
+	else:
+		script = simulate.InputScript.random(seed,maxTime)
+		inputName = "seed:%d" % seed
+	result = simulation.run(mapName,script,maxTime)
+	result["input"] = inputName
+	if result["outcome"] == "win":
+		result["timeToGoal"] = result["time"]
+	else:
+		result["timeToGoal"] = None
+	return result
+
+def main():
+	parser = argparse.ArgumentParser(description="Play levels headless across a process pool.")
+	parser.add_argument("--levels",nargs="+",default=None,help="levels to run (default: all of levels/)")
+	parser.add_argument("--scripts",nargs="+",default=[],help="input scripts to run on every level")
+	parser.add_argument("--seeds",nargs="+",type=int,default=[],help="random input seeds to run on every level")
+	parser.add_argument("--workers",type=int,default=multiprocessing.cpu_count(),help="worker processes")
+	parser.add_argument("--max-time",type=float,default=120.0,help="simulated seconds per run")
+	parser.add_argument("--step",type=float,default=1.0/60.0,help="simulated seconds per frame")
+	parser.add_argument("--format",choices=("json","csv"),default="json")
+	parser.add_argument("--output",help="file to write (default: stdout)")
+	args = parser.parse_args()
+
+	levels = args.levels or getLevels()
+	seeds = args.seeds
+	if not args.scripts and not seeds:
+		seeds = [0]
+	jobs = []
+	for mapName in levels:
+		for scriptPath in args.scripts:
+			jobs.append((mapName,scriptPath,None,args.max_time))
+		for seed in seeds:
+			jobs.append((mapName,None,seed,args.max_time))
+
+	#Spawn rather than fork so that every worker builds
+	#its own Panda3D instance from scratch.
+	context = multiprocessing.get_context("spawn")
+	pool = context.Pool(max(1,min(args.workers,len(jobs))),startWorker,(args.step,))
+	try:
+		results = pool.map(runJob,jobs,chunksize=1)
+	finally:
+		pool.close()
+		pool.join()
+
+	if args.output != None:
+		fp = open(args.output,"w",newline="")
+	else:
+		fp = sys.stdout
+	if args.format == "json":
+		json.dump(results,fp,indent=1)
+		fp.write("\n")
+	else:
+		writer = csv.DictWriter(fp,fields)
+		writer.writeheader()
+		writer.writerows(results)
+	if fp != sys.stdout:
+		fp.close()
+
+if __name__ == "__main__":
+	main()
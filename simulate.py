@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+#Headless simulation of the game.
+#
+#Runs World, Map, Truck and Baddie with no window, no display
+#regions and no sound, on a fixed timestep clock so a level plays
+#out as fast as the game logic allows.  The truck is driven by an
+#input script instead of the arrow keys.
+#
+#Usage: simulate.py [--script FILE] [--max-time SECONDS] [--step SECONDS] LEVEL...
+#
+#An input script has one event per line, "time key state", where
+#key is one of left, right, up or down, and state is 1 for pressed
+#and 0 for released.  Blank lines and lines starting with # are
+#ignored.  For example:
+#  0.0 up 1
+#  2.5 left 1
+#  3.0 left 0
+import argparse
+import glob
+import json
+import os
+import random
+import sys
+import time
+
+#The window and audio settings have to be in place before
+#DirectStart opens the (non-existent) window.  That only happens
+#when the first Simulation is made, so the batch runners can use
+#getLevels() without starting Panda3D.
+from panda3d.core import loadPrcFileData, ClockObject
+loadPrcFileData("simulate", "window-type none\n"
+							"audio-library-name null\n")
+
+def getLevels():
+	#Level names in levels/, numbered levels first in order
+	names = [os.path.splitext(os.path.basename(path))[0] for path in glob.glob("levels/*.txt")]
+	numbered = sorted([name for name in names if name.isdigit()],key=int)
+	return numbered+sorted([name for name in names if not name.isdigit()])
+
+class InputScript:
+	keys = ("left","right","up","down")
+
+	def __init__(self,events=()):
+		#List of (time, key, pressed), in time order
+		self.events = sorted(events)
+		self.index = 0
+
+	@staticmethod
+	def load(path):
+		events = []
+		fp = open(path,"r")
+		for line_num, line in enumerate(fp):
+			line = line.strip()
+			if not line or line.startswith("#"):
+				continue
+			try:
+				time, key, state = line.split()
+				if key not in InputScript.keys:
+					raise ValueError(key)
+				events.append((float(time),key,bool(int(state))))
+			except ValueError:
+				raise IOError("Could not interpret input script line %d: %s" % (line_num+1,repr(line)))
+		fp.close()
+		return InputScript(events)
+
+	@staticmethod
+	def random(seed,duration=120.0):
+		#Mostly drive forward, with random turns and the
+		#occasional stop or reverse.
+		rand = random.Random(seed)
+		events = [(0.0,"up",True)]
+		t = 0.0
+		while t < duration:
+			t += rand.uniform(0.5,3.0)
+			key = rand.choice(("left","right","left","right","down"))
+			hold = rand.uniform(0.2,1.5)
+			if key == "down":
+				events.append((t,"up",False))
+				events.append((t,"down",True))
+				events.append((t+hold,"down",False))
+				events.append((t+hold,"up",True))
+			else:
+				events.append((t,key,True))
+				events.append((t+hold,key,False))
+			t += hold
+		return InputScript(events)
+
+	def rewind(self):
+		self.index = 0
+
+	def apply(self,truck,time):
+		events = self.events
+		while self.index < len(events) and events[self.index][0] <= time:
+			eventTime, key, pressed = events[self.index]
+			truck.setKey(key,pressed)
+			self.index += 1
+
+class Simulation:
+	def __init__(self,step=1.0/60.0):
+		import direct.directbase.DirectStart
+		self.step = step
+		self.world = None
+		#Every frame advances the clock by exactly one step,
+		#no matter how long the frame really took.
+		globalClock.setMode(ClockObject.MNonRealTime)
+		globalClock.setFrameRate(1.0/step)
+
+	def load(self,mapName):
+		if self.world == None:
+			from World import World
+			self.world = World(mapName,headless=True)
+			self.world.scheduler.stepTime = self.step
+		else:
+			self.world.loadLevel(mapName)
+
+	def run(self,mapName,script=None,maxTime=120.0):
+		loadStart = time.perf_counter()
+		self.load(mapName)
+		loadTime = time.perf_counter()-loadStart
+		world = self.world
+		loadTimes = world.map.loadTimes
+		if script == None:
+			script = InputScript()
+		script.rewind()
+		for key in InputScript.keys:
+			world.truck.setKey(key,False)
+
+		#Simulated time is counted in whole steps rather than read
+		#from the clock, whose sums of steps aren't exact, so a run
+		#always takes the same number of frames and every event is
+		#applied on the same frame.
+		frameTimes = []
+		maxFrames = int(round(maxTime/self.step))
+		simTime = 0.0
+		while world.outcome == None and len(frameTimes) < maxFrames:
+			script.apply(world.truck,simTime)
+			frameStart = time.perf_counter()
+			taskMgr.step()
+			frameTimes.append(time.perf_counter()-frameStart)
+			simTime = len(frameTimes)*self.step
+
+		frameTimes.sort()
+		frames = len(frameTimes)
+		def percentile(p):
+			return 1000.0*frameTimes[min(frames-1,int(p*frames))] if frames else 0.0
+		return {"level":str(mapName),
+				"name":world.map.getName(),
+				"outcome":world.outcome or "timeout",
+				"time":simTime,
+				"frames":frames,
+				"baddies":len(world.baddies),
+				"kills":sum(1 for baddie in world.baddies if baddie.isDead),
+				"loadMs":1000.0*loadTime,
+				"parseMs":1000.0*loadTimes.get("parse",0.0),
+				"modelsMs":1000.0*loadTimes.get("models",0.0),
+				"collisionMs":1000.0*loadTimes.get("collision",0.0),
+				"populateMs":1000.0*loadTimes.get("populate",0.0),
+				"frameMeanMs":1000.0*sum(frameTimes)/frames if frames else 0.0,
+				"frameP50Ms":percentile(0.50),
+				"frameP95Ms":percentile(0.95),
+				"frameP99Ms":percentile(0.99),
+				"frameMaxMs":1000.0*frameTimes[-1] if frames else 0.0}
+
+def main():
+	parser = argparse.ArgumentParser(description="Run levels headless on a fixed timestep.")
+	parser.add_argument("levels",nargs="+",help="level numbers or names from levels/")
+	parser.add_argument("--script",help="input script driving the truck")
+	parser.add_argument("--max-time",type=float,default=120.0,help="simulated seconds before giving up")
+	parser.add_argument("--step",type=float,default=1.0/60.0,help="simulated seconds per frame")
+	args = parser.parse_args()
+
+	script = None
+	if args.script != None:
+		script = InputScript.load(args.script)
+	simulation = Simulation(args.step)
+	for mapName in args.levels:
+		result = simulation.run(mapName,script,args.max_time)
+		print(json.dumps(result))
+		sys.stdout.flush()
+
+if __name__ == "__main__":
+	main()